@@ -0,0 +1,258 @@
+import logging
+import math
+import pandas as pd
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Vega-Lite defaults we mirror so pre-aggregated charts look the same
+MAX_BINS = 10
+DENSITY_STEPS = 200
+# Fine histogram the density estimate is computed from (binned KDE)
+DENSITY_GRID = 1024
+# Grouped densities over more groups than this fall back to client-side
+MAX_DENSITY_GROUPS = 50
+
+AGG_OPS = {"sum", "mean", "max", "min", "count"}
+# Channels that never carry data fields
+_PASSTHROUGH = {"innerRadius", "width", "interpolate"}
+
+
+def nice_bins(lo: float, hi: float, maxbins: int = MAX_BINS) -> Tuple[float, float]:
+    """
+    (start, step) of "nice" bins covering [lo, hi], using 1/2/5 x 10^k
+    steps like Vega-Lite's bin transform.
+    """
+    span = hi - lo
+    if not math.isfinite(span) or span <= 0:
+        return lo, 1.0
+    raw = span / maxbins
+    base = 10 ** math.floor(math.log10(raw))
+    step = next(m * base for m in (1, 2, 5, 10) if m * base >= raw)
+    return math.floor(lo / step) * step, step
+
+
+class Aggregator:
+    """
+    Computes pre-aggregated datasets for recommendations over a full
+    dataframe. Group-bys and bin assignments are memoized per request, so
+    specs that share keys (e.g. every "by Category" bar) reuse them.
+    """
+
+    def __init__(self, df: pd.DataFrame, columns: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.df = df
+        self.columns = columns or {}
+        self._bins: Dict[Any, Tuple[pd.Series, float]] = {}
+        self._groups: Dict[Tuple, Any] = {}
+
+    # --- public ---
+
+    def aggregate(self, rec: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Returns a copy of `rec` whose "data" holds the aggregated rows and
+        whose encoding refers to the aggregated fields, or None if the spec
+        has no aggregate / bin / density step to move server-side.
+        """
+        try:
+            transform = rec.get("transform")
+            if transform:
+                if len(transform) == 1 and "density" in transform[0]:
+                    return self._density(rec, transform[0])
+                return None
+            return self._group_aggregate(rec)
+        except (KeyError, TypeError, ValueError, OverflowError) as e:
+            logger.debug("Aggregation skipped for %s: %s", rec.get("id"), e)
+            return None
+
+    # --- group-by / bin aggregates ---
+
+    def _group_aggregate(self, rec):
+        encoding = rec["encoding"]
+        keys: List[Any] = []
+        aggs: Dict[str, Tuple[Any, str]] = {}
+        new_encoding = {}
+
+        for channel, enc in encoding.items():
+            if channel in _PASSTHROUGH or not isinstance(enc, dict) or "value" in enc:
+                new_encoding[channel] = enc
+                continue
+            enc = dict(enc)
+            op = enc.pop("aggregate", None)
+            field = enc.get("field")
+            if op is not None:
+                if op not in AGG_OPS:
+                    return None
+                out = "count" if op == "count" else f"{op}_{field}"
+                aggs[out] = (field, op)
+                enc["field"] = out
+                enc["type"] = "quantitative"
+                new_encoding[channel] = enc
+            elif enc.get("bin"):
+                if not pd.api.types.is_numeric_dtype(self.df[field].dtype):
+                    return None
+                enc["bin"] = {"binned": True}
+                enc["type"] = "quantitative"
+                new_encoding[channel] = enc
+                new_encoding[f"{channel}2"] = {"field": f"{field}_end"}
+                keys.append(("bin", field))
+            elif field is not None:
+                new_encoding[channel] = enc
+                if ("field", field) not in keys:
+                    keys.append(("field", field))
+            else:
+                new_encoding[channel] = enc
+
+        # Nothing to aggregate: a raw-row chart (scatter, line, ...) needs the rows
+        if not aggs or not keys:
+            return None
+
+        grouped = self._groupby(tuple(keys))
+        result = {}
+        for out, (field, op) in aggs.items():
+            result[out] = grouped.size() if op == "count" else grouped[field].agg(op)
+        data = pd.DataFrame(result).reset_index()
+
+        for kind, field in keys:
+            if kind == "bin":
+                _, step = self._bin(field)
+                data[f"{field}_end"] = data[field] + step
+
+        out_rec = dict(rec)
+        out_rec["encoding"] = new_encoding
+        out_rec["transform"] = None
+        out_rec["data"] = _records(data)
+        return out_rec
+
+    def _bin(self, field):
+        """
+        Bin start for every row of `field` plus the bin step (memoized).
+        Bins cover the finite values; NaN and +-inf rows get no bin.
+        """
+        if field not in self._bins:
+            values = self.df[field].astype("float64")
+            finite = values[np.isfinite(values)]
+            if finite.empty:
+                raise ValueError(f"no finite values in {field}")
+            info = self.columns.get(field, {})
+            lo = info.get("min") if info.get("min") is not None else finite.min()
+            hi = info.get("max") if info.get("max") is not None else finite.max()
+            start, step = nice_bins(float(lo), float(hi))
+            last = start + max(math.ceil((float(hi) - start) / step) - 1, 0) * step
+            # the maximum belongs to the last bin, not a new one starting at it
+            starts = (np.floor((values - start) / step) * step + start).clip(upper=last)
+            starts = starts.where(np.isfinite(values))
+            self._bins[field] = (starts.rename(field), step)
+        return self._bins[field]
+
+    def _groupby(self, keys: Tuple):
+        if keys not in self._groups:
+            # group-by keys are Series aligned on the index, so binned keys
+            # carry the bin start under the original field name
+            by = [self._bin(field)[0] if kind == "bin" else self.df[field] for kind, field in keys]
+            self._groups[keys] = self.df.groupby(by, sort=True, dropna=True, observed=True)
+        return self._groups[keys]
+
+    # --- density ---
+
+    def _density(self, rec, step):
+        col = step["density"]
+        groupby = step.get("groupby") or []
+        values = self.df[col].astype("float64")
+        finite = values[np.isfinite(values)]
+        lo, hi = finite.min(), finite.max()
+        if not (math.isfinite(lo) and math.isfinite(hi)) or lo == hi:
+            return None
+
+        if groupby:
+            grouped = values.groupby([self.df[g] for g in groupby], sort=True, dropna=True, observed=True)
+            if grouped.ngroups > MAX_DENSITY_GROUPS:
+                return None
+            frames = []
+            for key, part in grouped:
+                curve = kde_curve(part.to_numpy(), lo, hi)
+                if curve is None:
+                    continue
+                key = key if isinstance(key, tuple) else (key,)
+                for g, v in zip(groupby, key):
+                    curve[g] = v
+                frames.append(curve)
+            if not frames:
+                return None
+            data = pd.concat(frames, ignore_index=True)
+        else:
+            data = kde_curve(values.to_numpy(), lo, hi)
+            if data is None:
+                return None
+
+        out_rec = dict(rec)
+        out_rec["transform"] = None
+        out_rec["data"] = _records(data)
+        return out_rec
+
+
+def kde_curve(values: np.ndarray, lo: float, hi: float, steps: int = DENSITY_STEPS) -> Optional[pd.DataFrame]:
+    """
+    Gaussian kernel density of `values` sampled at `steps` points on
+    [lo, hi], as a {"value", "density"} frame. The values are first
+    histogrammed on a fine grid, so the cost is O(n + grid * steps)
+    regardless of row count. Bandwidth follows Vega's estimate
+    (Scott's rule with the IQR guard).
+    """
+    values = values[np.isfinite(values)]
+    n = len(values)
+    if n < 2:
+        return None
+    std = values.std(ddof=1)
+    q1, q3 = np.percentile(values, [25, 75])
+    spread = min(std, (q3 - q1) / 1.34) or std
+    if not spread:
+        return None
+    bandwidth = 1.06 * spread * n ** -0.2
+
+    counts, edges = np.histogram(values, bins=DENSITY_GRID, range=(lo, hi))
+    centers = (edges[:-1] + edges[1:]) / 2
+    xs = np.linspace(lo, hi, steps)
+    z = (xs[:, None] - centers[None, :]) / bandwidth
+    density = (np.exp(-0.5 * z * z) @ counts) / (n * bandwidth * math.sqrt(2 * math.pi))
+    return pd.DataFrame({"value": xs, "density": density})
+
+
+def _records(data: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Records with NaN turned into None so the response stays valid JSON."""
+    return data.astype(object).where(data.notna(), None).to_dict(orient="records")
+
+
+def spec_fields(rec: Dict[str, Any]) -> List[str]:
+    """Every column a recommendation spec reads, in first-use order."""
+    fields = []
+    for enc in (rec.get("encoding") or {}).values():
+        if isinstance(enc, dict) and isinstance(enc.get("field"), str):
+            fields.append(enc["field"])
+    for step in rec.get("transform") or []:
+        if isinstance(step, dict):
+            if isinstance(step.get("density"), str):
+                fields.append(step["density"])
+            fields.extend(step.get("groupby") or [])
+    return list(dict.fromkeys(fields))
+
+
+def recommendation_fields(recs: List[Dict[str, Any]]) -> List[str]:
+    """Union of spec_fields over `recs`: the only columns aggregation needs."""
+    fields = []
+    for rec in recs:
+        fields.extend(spec_fields(rec))
+    return list(dict.fromkeys(fields))
+
+
+def aggregate_recommendations(df: pd.DataFrame, analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Replaces every recommendation that can be computed server-side with its
+    pre-aggregated version; the rest are left to render from the preview.
+    """
+    aggregator = Aggregator(df, analysis.get("columns"))
+    recs = []
+    for rec in analysis["recommendations"]:
+        recs.append(aggregator.aggregate(rec) or rec)
+    analysis["recommendations"] = recs
+    return analysis
@@ -0,0 +1,251 @@
+"""
+Benchmark suite for ingestion, analysis, serialization, image detection and
+the HTTP endpoints (in-process). Results are written as JSON so runs from
+different commits can be compared:
+
+    python benchmark.py --rows 10000 1000000 --out before.json
+    python benchmark.py --rows 10000 1000000 --out after.json --compare before.json
+"""
+import os
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+from statistics import median
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from generate_sample_data import generate_large_data, generate_chart_image, DTYPES
+from analyzer import analyze_dataframe
+from aggregation import aggregate_recommendations
+from ingestion import stream_csv
+from pipeline import load_dataframe, run_analysis
+from serialization import render_result, FORMATS
+from image_analysis import detect_chart_type, WORK_SIZE
+
+# Excel files are only generated up to this many rows (slow to write, 1M row limit)
+EXCEL_MAX_ROWS = 100_000
+IMAGE_SIZES = [(640, 480), (1920, 1080), (3840, 2160)]
+IMAGE_KINDS = {"bar": "bar", "pie": "arc", "line": "line"}
+
+
+def measure(fn: Callable[[], Any], repeat: int = 3, memory: bool = True) -> Dict[str, Any]:
+    """
+    Runs `fn` `repeat` times for timing, then once more under tracemalloc
+    for the peak Python/numpy allocation (kept out of the timed runs because
+    tracing slows allocation-heavy code down).
+    """
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t0)
+    result = {"seconds": median(runs), "min_seconds": min(runs), "runs": len(runs)}
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            result["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1 << 20), 2)
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+class Suite:
+    def __init__(self, repeat: int, memory: bool):
+        self.repeat = repeat
+        self.memory = memory
+        self.results: List[Dict[str, Any]] = []
+
+    def bench(self, name: str, fn: Callable[[], Any], **params):
+        try:
+            stats = measure(fn, self.repeat, self.memory)
+        except Exception as e:
+            stats = {"error": f"{type(e).__name__}: {e}"}
+        entry = {"name": name, "params": params, **stats}
+        self.results.append(entry)
+        detail = f"{stats['seconds'] * 1000:10.1f} ms" if "seconds" in stats else stats["error"]
+        if "peak_mb" in stats:
+            detail += f"  {stats['peak_mb']:8.1f} MB"
+        print(f"{name:<34} {json.dumps(params):<46} {detail}")
+        return entry
+
+
+# --- DATA BENCHMARKS ---
+
+def bench_data(suite: Suite, rows: int, width: int, dtypes, workdir: str, seed: int):
+    params = {"rows": rows, "width": width}
+    df = generate_large_data(rows, width, dtypes, seed=seed)
+    csv_path = os.path.join(workdir, f"data_{rows}.csv")
+    df.to_csv(csv_path, index=False)
+    params["csv_mb"] = round(os.path.getsize(csv_path) / (1 << 20), 2)
+
+    # 1. Ingestion
+    suite.bench("ingest.read_csv", lambda: pd.read_csv(csv_path), **params)
+    suite.bench("ingest.load_dataframe", lambda: load_dataframe(csv_path, "data.csv"), **params)
+    suite.bench("ingest.stream_csv", lambda: stream_csv(csv_path), **params)
+    if rows <= EXCEL_MAX_ROWS:
+        xlsx_path = os.path.join(workdir, f"data_{rows}.xlsx")
+        df.to_excel(xlsx_path, index=False)
+        suite.bench("ingest.read_excel", lambda: pd.read_excel(xlsx_path), **params)
+
+    # 2. Analysis
+    typed = load_dataframe(csv_path, "data.csv")
+    suite.bench("analyze_dataframe", lambda: analyze_dataframe(typed), **params)
+    suite.bench("analyze_dataframe.approx", lambda: analyze_dataframe(typed, approx_distinct=True), **params)
+    analysis = analyze_dataframe(typed)
+    suite.bench("aggregate_recommendations",
+                lambda: aggregate_recommendations(typed, {**analysis, "recommendations": list(analysis["recommendations"])}),
+                **params)
+
+    # 3. Preview serialization
+    result = run_analysis(csv_path, "data.csv")
+    for fmt in FORMATS:
+        suite.bench("serialize", lambda: render_result(result, fmt).body, format=fmt, **params)
+    return csv_path
+
+
+# --- IMAGE BENCHMARKS ---
+
+def bench_images(suite: Suite, seed: int):
+    for kind, expected in IMAGE_KINDS.items():
+        for width, height in IMAGE_SIZES:
+            for ext in (".png", ".jpg"):
+                content = generate_chart_image(kind, width, height, seed=seed, ext=ext)
+                for label, max_side in (("fast", WORK_SIZE), ("full", None)):
+                    entry = suite.bench("detect_chart_type", lambda: detect_chart_type(content, max_side),
+                                        kind=kind, size=f"{width}x{height}", ext=ext, mode=label)
+                    entry["correct"] = detect_chart_type(content, max_side) == expected
+
+
+# --- ENDPOINT BENCHMARKS ---
+
+def bench_endpoints(suite: Suite, csv_path: str, rows: int, seed: int):
+    # Requests run through the app's real worker pool, so peak_mb here covers
+    # the server process only, not the parsing done in worker processes.
+    from fastapi.testclient import TestClient
+    import main
+
+    with open(csv_path, "rb") as f:
+        contents = f.read()
+    image = generate_chart_image("bar", 1920, 1080, seed=seed)
+    params = {"rows": rows}
+
+    with TestClient(main.app) as client:
+        def post_csv(url, cold=True):
+            if cold:
+                main.result_cache.clear()
+            client.post(url, files={"file": ("data.csv", contents)}).raise_for_status()
+
+        suite.bench("endpoint.analyze-data.cold", lambda: post_csv("/analyze-data"), **params)
+        suite.bench("endpoint.analyze-data.stream", lambda: post_csv("/analyze-data?stream=true"), **params)
+        post_csv("/analyze-data")
+        suite.bench("endpoint.analyze-data.cached", lambda: post_csv("/analyze-data", cold=False), **params)
+
+        dataset_id = client.post("/datasets", files={"file": ("data.csv", contents)}).json()["dataset_id"]
+
+        def dataset_analyze():
+            main.result_cache.clear()
+            client.get(f"/datasets/{dataset_id}/analyze").raise_for_status()
+
+        suite.bench("endpoint.datasets.analyze", dataset_analyze, **params)
+        suite.bench("endpoint.datasets.preview",
+                    lambda: client.get(f"/datasets/{dataset_id}/preview?offset={rows // 2}&limit=100").raise_for_status(),
+                    **params)
+        client.delete(f"/datasets/{dataset_id}")
+
+        def post_image(cold=True):
+            if cold:
+                main.image_cache.clear()
+            client.post("/analyze-image", files={"file": ("chart.png", image)}).raise_for_status()
+
+        suite.bench("endpoint.analyze-image.cold", post_image, size="1920x1080")
+        post_image()
+        suite.bench("endpoint.analyze-image.cached", lambda: post_image(cold=False), size="1920x1080")
+
+
+# --- REPORTING ---
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "commit": commit or None,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "pyarrow": pa.__version__,
+    }
+
+
+def _key(entry):
+    return entry["name"], json.dumps(entry["params"], sort_keys=True)
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, threshold: float = 1.1):
+    """Prints new/old time ratios against an earlier results file, flagging slowdowns."""
+    with open(baseline_path) as f:
+        old = {_key(e): e for e in json.load(f)["results"]}
+    print(f"\nCompared with {baseline_path} (ratio = new / old)")
+    for entry in results:
+        before = old.get(_key(entry))
+        if not before or "seconds" not in before or "seconds" not in entry:
+            continue
+        ratio = entry["seconds"] / before["seconds"] if before["seconds"] else float("inf")
+        flag = "  SLOWER" if ratio > threshold else ("  faster" if ratio < 1 / threshold else "")
+        print(f"{entry['name']:<34} {json.dumps(entry['params']):<46} {ratio:6.2f}x{flag}")
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="ChartYap backend benchmarks")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--width", type=int, default=8)
+    parser.add_argument("--dtypes", nargs="+", default=["numeric", "categorical", "datetime"], choices=DTYPES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc peak-memory run")
+    parser.add_argument("--skip", nargs="*", default=[], choices=["data", "images", "endpoints"])
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    suite = Suite(args.repeat, memory=not args.no_memory)
+    workdir = tempfile.mkdtemp(prefix="chartyap-bench-")
+    try:
+        for rows in args.rows:
+            csv_path = None
+            if "data" not in args.skip:
+                csv_path = bench_data(suite, rows, args.width, args.dtypes, workdir, args.seed)
+            if "endpoints" not in args.skip:
+                if csv_path is None:
+                    csv_path = os.path.join(workdir, f"data_{rows}.csv")
+                    generate_large_data(rows, args.width, args.dtypes, seed=args.seed).to_csv(csv_path, index=False)
+                bench_endpoints(suite, csv_path, rows, args.seed)
+        if "images" not in args.skip:
+            bench_images(suite, args.seed)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {"environment": environment(), "args": vars(args), "results": suite.results}
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.out}")
+    if args.compare:
+        compare(suite.results, args.compare)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,173 @@
+import logging
+import os
+import time
+import pickle
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def hash_upload(fileobj=None, contents: Optional[bytes] = None) -> str:
+    """
+    SHA-256 of an upload, either from bytes already in memory or by reading
+    the (spooled) file object in blocks. The file position is rewound.
+    """
+    digest = hashlib.sha256()
+    if contents is not None:
+        digest.update(contents)
+    else:
+        fileobj.seek(0)
+        for block in iter(lambda: fileobj.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+        fileobj.seek(0)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    LRU + TTL cache for analysis results with a memory budget in bytes and
+    an optional on-disk tier.
+
+    Entries are pickled once on insert; the pickle length is the entry's
+    cost against the budget and the payload written to disk. Entries evicted
+    from memory stay on disk (if enabled) and are promoted back on a hit.
+    On disk, a file's mtime is its write time (for the TTL) and its atime
+    its last hit (for LRU eviction past `disk_max_bytes`).
+    """
+
+    def __init__(self, max_bytes: int = 256 << 20, ttl: float = 3600.0,
+                 disk_dir: Optional[str] = None, disk_max_bytes: int = 2 << 30):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[2]
+                self._drop(key)
+
+        blob = self._disk_read(key, now)
+        with self._lock:
+            if blob is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        value = pickle.loads(blob)
+        self._insert(key, value, len(blob))
+        return value
+
+    def put(self, key: str, value: Any):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._insert(key, value, len(blob))
+        self._disk_write(key, blob)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+    # --- memory tier ---
+
+    def _insert(self, key: str, value: Any, size: int):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.time() + self.ttl, size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _drop(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    # --- disk tier ---
+
+    def _disk_path(self, key: str) -> str:
+        # keys contain ":" (not allowed in Windows file names); hash them
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, f"{name}.pkl")
+
+    def _disk_read(self, key: str, now: float) -> Optional[bytes]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            written = os.path.getmtime(path)
+            if written + self.ttl <= now:
+                os.remove(path)
+                return None
+            with open(path, "rb") as f:
+                blob = f.read()
+            # mark as recently used without extending the TTL
+            os.utime(path, (now, written))
+            return blob
+        except OSError:
+            return None
+
+    def _disk_write(self, key: str, blob: bytes):
+        if not self.disk_dir:
+            return
+        # unique per write: concurrent puts of one key must not share a temp file
+        tmp = f"{self._disk_path(key)}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(blob)
+            os.replace(tmp, self._disk_path(key))
+            self._disk_prune()
+        except OSError as e:
+            logger.warning("Result cache disk write failed: %s", e)
+
+    def _disk_prune(self):
+        files = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith(".pkl"):
+                path = os.path.join(self.disk_dir, name)
+                stat = os.stat(path)
+                files.append((stat.st_atime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            os.remove(path)
+            total -= size
@@ -0,0 +1,342 @@
+import re
+import itertools
+from collections import Counter
+from typing import Dict, Any, List, Iterator, Tuple, Callable, Optional
+
+# --- 45 CHART CAPABILITY REGISTRY ---
+# Chart templates are declared once as data and compiled at import time.
+# Strings may reference bound columns with str.format placeholders ("{col}");
+# a value that is exactly one placeholder is replaced by the raw column name,
+# so non-string column labels survive in encodings.
+
+_ROLE = re.compile(r"^\{(\w+)\}$")
+
+
+def _compile(obj) -> Callable[[Dict[str, Any]], Any]:
+    """
+    Turns a spec skeleton into a builder(binding) that returns a fresh copy
+    with the placeholders filled in.
+    """
+    if isinstance(obj, dict):
+        items = [(k, _compile(v)) for k, v in obj.items()]
+        return lambda b: {k: build(b) for k, build in items}
+    if isinstance(obj, list):
+        parts = [_compile(v) for v in obj]
+        return lambda b: [build(b) for build in parts]
+    if isinstance(obj, str):
+        role = _ROLE.match(obj)
+        if role:
+            name = role.group(1)
+            return lambda b: b[name]
+        if "{" in obj:
+            return lambda b: obj.format(**b)
+    return lambda b: obj
+
+
+def _signature_part(encoding: Dict[str, Any], channel: str, key: str):
+    """(is_role, value) for encoding[channel][key] of the skeleton."""
+    value = encoding.get(channel, {}).get(key, "") if isinstance(encoding.get(channel), dict) else ""
+    role = _ROLE.match(value) if isinstance(value, str) else None
+    if role:
+        return (True, role.group(1))
+    return (False, str(value))
+
+
+class ChartTemplate:
+    """
+    One chart capability: which column types it needs (`requires`), how its
+    columns are bound (`binding`), an optional data predicate (`when`) and
+    the spec skeleton. The dedup signature (Mark + X/Y/Theta fields + X/Y
+    aggregations) is derived from the skeleton once, so it can be checked
+    before the spec is built.
+    """
+
+    def __init__(self, binding: str, requires: Tuple[str, ...], id: str, title: str, desc: str,
+                 mark, encoding: Dict[str, Any], transform: Optional[List[Any]] = None,
+                 when: Optional[str] = None):
+        self.binding = binding
+        self.key = tuple(sorted(requires))
+        self.id = id
+        self.when = when
+        self.position = 0  # index within its binding, set when the registry is indexed
+        self._build = _compile({
+            "id": id,
+            "title": title,
+            "description": desc,
+            "type": mark,
+            "encoding": encoding,
+            "transform": transform,
+        })
+        self._signature = [(False, str(mark))] + [
+            _signature_part(encoding, channel, key)
+            for channel, key in (("x", "field"), ("y", "field"), ("theta", "field"),
+                                 ("x", "aggregate"), ("y", "aggregate"))
+        ]
+
+    def signature(self, binding: Dict[str, Any]) -> str:
+        return "_".join(str(binding[v]) if is_role else v for is_role, v in self._signature)
+
+    def build(self, binding: Dict[str, Any]) -> Dict[str, Any]:
+        return self._build(binding)
+
+
+# --- BINDINGS ---
+# Each binding enumerates column assignments lazily from the typed column lists.
+
+def _each_numeric(cols):
+    for col in cols["numeric"]:
+        yield {"col": col}
+
+def _each_categorical(cols):
+    # If we have a numeric column, Sum/Mean charts use the first one
+    val = cols["numeric"][0] if cols["numeric"] else None
+    for col in cols["categorical"]:
+        yield {"col": col, "val": val}
+
+def _numeric_pairs(cols):
+    for x, y in itertools.combinations(cols["numeric"], 2):
+        yield {"x": x, "y": y}
+
+def _numeric_by_categorical(cols):
+    for num, cat in itertools.product(cols["numeric"], cols["categorical"]):
+        yield {"num": num, "cat": cat}
+
+def _time_series(cols):
+    for num in cols["numeric"][:2]:
+        yield {"t": cols["datetime"][0], "num": num}
+
+def _three_numeric(cols):
+    x, y, z = cols["numeric"][:3]
+    yield {"x": x, "y": y, "z": z}
+
+def _two_numeric_categorical(cols):
+    x, y = cols["numeric"][:2]
+    yield {"x": x, "y": y, "c": cols["categorical"][0]}
+
+def _time_categorical(cols):
+    yield {"t": cols["datetime"][0], "n": cols["numeric"][0], "c": cols["categorical"][0]}
+
+def _first_numeric(cols):
+    yield {"col": cols["numeric"][0]}
+
+def _first_categorical(cols):
+    yield {"col": cols["categorical"][0]}
+
+# Registry order: candidates come out binding by binding, in this order.
+BINDINGS = [
+    ("each_numeric", _each_numeric),
+    ("each_categorical", _each_categorical),
+    ("numeric_pairs", _numeric_pairs),
+    ("numeric_by_categorical", _numeric_by_categorical),
+    ("time_series", _time_series),
+    ("three_numeric", _three_numeric),
+    ("two_numeric_categorical", _two_numeric_categorical),
+    ("time_categorical", _time_categorical),
+    ("first_numeric", _first_numeric),
+    ("first_categorical", _first_categorical),
+]
+
+
+# --- PREDICATES ---
+
+def is_unique_id(columns: Dict[str, Dict[str, Any]], col, n_rows: int) -> bool:
+    # Ratio > 0.9 means mostly unique, like IDs
+    return n_rows > 0 and (columns[col]["unique_values"] / n_rows) > 0.9
+
+PREDICATES = {
+    # Count-based charts on a unique ID column give every bar size 1
+    "not_unique_id": lambda b, columns, n_rows: not is_unique_id(columns, b["col"], n_rows),
+}
+
+
+N = "numeric"
+C = "categorical"
+T = "datetime"
+
+TEMPLATES = [
+    # --- 1. SINGLE NUMERIC (DISTRIBUTIONS) ---
+    # 1. Histogram
+    ChartTemplate("each_numeric", (N,), "hist_{col}", "Histogram: {col}", "Frequency distribution.", "bar",
+        {"x": {"field": "{col}", "bin": True}, "y": {"aggregate": "count"}}),
+    # 2. Density Area
+    ChartTemplate("each_numeric", (N,), "dens_area_{col}", "Density Area: {col}", "Smoothed distribution.", "area",
+        {"x": {"field": "value", "type": "quantitative"}, "y": {"field": "density", "type": "quantitative"}}, transform=[{"density": "{col}"}]),
+    # 3. Density Line
+    ChartTemplate("each_numeric", (N,), "dens_line_{col}", "Density Curve: {col}", "Outline of distribution.", "line",
+        {"x": {"field": "value", "type": "quantitative"}, "y": {"field": "density", "type": "quantitative"}}, transform=[{"density": "{col}"}]),
+    # 4. Boxplot
+    ChartTemplate("each_numeric", (N,), "box_{col}", "Boxplot: {col}", "Median and quartiles.", "boxplot",
+        {"y": {"field": "{col}", "type": "quantitative"}}),
+    # 5. Review (Violin-ish with tick)
+    ChartTemplate("each_numeric", (N,), "strip_{col}", "Strip Plot: {col}", "Individual data points.", "tick",
+        {"x": {"field": "{col}", "type": "quantitative"}}),
+    # 6. ECDF (Cumulative) - approximation via window
+    ChartTemplate("each_numeric", (N,), "cdf_{col}", "CDF: {col}", "Cumulative density.", "line",
+        {"x": {"field": "{col}", "type": "quantitative"}, "y": {"aggregate": "count", "type": "quantitative", "stack": "normalize"}},
+        transform=[{"window": [{"op": "count", "as": "count"}], "sort": [{"field": "{col}"}]}]), # simplified
+    # 7. Dot Plot
+    ChartTemplate("each_numeric", (N,), "dot_{col}", "Dot Plot: {col}", "Binned dot frequency.", "circle",
+        {"x": {"field": "{col}", "bin": True}, "y": {"aggregate": "count"}}),
+
+    # --- 2. SINGLE CATEGORICAL ---
+    # 8. Unsorted Bar (Sum)
+    ChartTemplate("each_categorical", (C, N), "bar_sum_{col}_{val}", "Bar Chart: {col}", "Sum of {val}", "bar",
+        {"x": {"field": "{col}", "type": "nominal"}, "y": {"field": "{val}", "type": "quantitative", "aggregate": "sum"}}),
+    # 9. Sorted Bar (Sum)
+    ChartTemplate("each_categorical", (C, N), "bar_sort_sum_{col}_{val}", "Sorted Bar: {col}", "Ordered by {val}", "bar",
+        {"x": {"field": "{col}", "type": "nominal", "sort": "-y"}, "y": {"field": "{val}", "type": "quantitative", "aggregate": "sum"}}),
+    # 11. Pie Chart (Sum)
+    ChartTemplate("each_categorical", (C, N), "pie_{col}", "Pie: {col}", "Share of {val}", "arc",
+        {"theta": {"aggregate": "sum", "field": "{val}"}, "color": {"field": "{col}", "type": "nominal"}}),
+    # 12. Donut Chart (Sum)
+    ChartTemplate("each_categorical", (C, N), "donut_{col}", "Donut: {col}", "Ring chart.", "arc",
+        {"theta": {"aggregate": "sum", "field": "{val}"}, "color": {"field": "{col}", "type": "nominal"}, "innerRadius": 50}),
+    # 10. Unsorted Bar (Count)
+    ChartTemplate("each_categorical", (C,), "bar_cat_{col}", "Bar Count: {col}", "Category frequency.", "bar",
+        {"x": {"field": "{col}", "type": "nominal"}, "y": {"aggregate": "count"}}, when="not_unique_id"),
+    # 11. Horizontal Bar (Count)
+    ChartTemplate("each_categorical", (C,), "hbar_cat_{col}", "Horiz Bar: {col}", "Category frequency.", "bar",
+        {"y": {"field": "{col}", "type": "nominal"}, "x": {"aggregate": "count"}}, when="not_unique_id"),
+    # 13. Lollipop (Bar with width 1 - simplified)
+    ChartTemplate("each_categorical", (C, N), "lollipop_{col}", "Lollipop: {col}", "Value of {val}", "bar",
+        {"x": {"field": "{col}", "type": "nominal"}, "y": {"field": "{val}", "aggregate": "sum"}, "width": 2}),
+
+    # --- 3. TWO NUMERIC ---
+    # 14. Scatter
+    ChartTemplate("numeric_pairs", (N, N), "scatter_{x}_{y}", "Scatter: {x} vs {y}", "Correlation.", "point",
+        {"x": {"field": "{x}", "type": "quantitative"}, "y": {"field": "{y}", "type": "quantitative"}}),
+    # 15. Bubble (using size for one variable, but here mapping x/y, mock size)
+    ChartTemplate("numeric_pairs", (N, N), "bubble_{x}_{y}", "Bubble: {x} vs {y}", "Weighted points.", "circle",
+        {"x": {"field": "{x}", "type": "quantitative"}, "y": {"field": "{y}", "type": "quantitative"}, "size": {"field": "{y}", "type": "quantitative"}}),
+    # 16. Heatmap (Binned)
+    ChartTemplate("numeric_pairs", (N, N), "heat_{x}_{y}", "Heatmap: {x} vs {y}", "2D Histogram.", "rect",
+        {"x": {"field": "{x}", "bin": True}, "y": {"field": "{y}", "bin": True}, "color": {"aggregate": "count"}}),
+    # 17. Connected Scatter
+    ChartTemplate("numeric_pairs", (N, N), "conn_scat_{x}_{y}", "Connected: {x} vs {y}", "Path of values.", "line",
+        {"x": {"field": "{x}", "type": "quantitative"}, "y": {"field": "{y}", "type": "quantitative"}, "order": {"field": "{x}"}}),
+    # 18. Line Regression (Basic Line)
+    ChartTemplate("numeric_pairs", (N, N), "line_reg_{x}_{y}", "Line: {x} vs {y}", "Trend line.", "line",
+        {"x": {"field": "{x}", "type": "quantitative"}, "y": {"field": "{y}", "type": "quantitative"}}),
+    # 19. Area Step
+    ChartTemplate("numeric_pairs", (N, N), "area_step_{x}_{y}", "Step Area: {x} vs {y}", "Stepped magnitude.", "area",
+        {"x": {"field": "{x}", "type": "quantitative"}, "y": {"field": "{y}", "type": "quantitative"}, "interpolate": "step"}),
+
+    # --- 4. NUMERIC + CATEGORICAL ---
+    # 20. Bar (Mean)
+    ChartTemplate("numeric_by_categorical", (N, C), "bar_avg_{num}_{cat}", "Avg {num} by {cat}", "Mean comparison.", "bar",
+        {"x": {"field": "{cat}", "type": "nominal"}, "y": {"field": "{num}", "type": "quantitative", "aggregate": "mean"}}),
+    # 21. Bar (Max)
+    ChartTemplate("numeric_by_categorical", (N, C), "bar_max_{num}_{cat}", "Max {num} by {cat}", "Peak values.", "bar",
+        {"x": {"field": "{cat}", "type": "nominal"}, "y": {"field": "{num}", "type": "quantitative", "aggregate": "max"}}),
+    # 22. Boxplot Grouped
+    ChartTemplate("numeric_by_categorical", (N, C), "box_grp_{num}_{cat}", "Box: {num} by {cat}", "Grouped distributions.", "boxplot",
+        {"x": {"field": "{cat}", "type": "nominal"}, "y": {"field": "{num}", "type": "quantitative"}}),
+    # 23. Violin (Density + Facet - using simple density line faceted)
+    ChartTemplate("numeric_by_categorical", (N, C), "violin_sim_{num}_{cat}", "Density: {num} by {cat}", "Faceted density.", "area",
+        {"x": {"field": "value"}, "y": {"field": "density"}, "row": {"field": "{cat}"}}, transform=[{"density": "{num}", "groupby": ["{cat}"]}]),
+    # 24. Tick Plot Grouped
+    ChartTemplate("numeric_by_categorical", (N, C), "tick_grp_{num}_{cat}", "Ticks: {num} by {cat}", "Raw value strip.", "tick",
+        {"y": {"field": "{cat}", "type": "nominal"}, "x": {"field": "{num}", "type": "quantitative"}}),
+    # 25. Point Plot (Stat)
+    ChartTemplate("numeric_by_categorical", (N, C), "point_stat_{num}_{cat}", "Mean Point: {num} by {cat}", "Focus on mean.", "circle",
+        {"x": {"field": "{cat}", "type": "nominal"}, "y": {"field": "{num}", "type": "quantitative", "aggregate": "mean"}, "size": {"value": 100}}),
+    # 26. Radial Bar (Simulated with Bar + Polar coord is hard in pure VL JSON without config, using Bar)
+    # 27. Error Bar (Simulated with Rule)
+    ChartTemplate("numeric_by_categorical", (N, C), "rule_range_{num}_{cat}", "Range: {num} by {cat}", "Min-max range.", "rule",
+        {"x": {"field": "{cat}", "type": "nominal"}, "y": {"field": "{num}", "aggregate": "min"}, "y2": {"field": "{num}", "aggregate": "max"}}),
+
+    # --- 5. TIME SERIES ---
+    # 28. Line Time
+    ChartTemplate("time_series", (T, N), "line_t_{num}", "Timeline: {num}", "Trend over time.", "line",
+        {"x": {"field": "{t}", "type": "temporal"}, "y": {"field": "{num}", "type": "quantitative"}}),
+    # 29. Area Time
+    ChartTemplate("time_series", (T, N), "area_t_{num}", "Area: {num}", "Volume over time.", "area",
+        {"x": {"field": "{t}", "type": "temporal"}, "y": {"field": "{num}", "type": "quantitative"}}),
+    # 30. Step Line
+    ChartTemplate("time_series", (T, N), "step_t_{num}", "Step: {num}", "Discrete changes.", {"type": "line", "interpolate": "step-after"},
+        {"x": {"field": "{t}", "type": "temporal"}, "y": {"field": "{num}", "type": "quantitative"}}),
+    # 31. Point Time
+    ChartTemplate("time_series", (T, N), "point_t_{num}", "Events: {num}", "Discrete measurements.", "point",
+        {"x": {"field": "{t}", "type": "temporal"}, "y": {"field": "{num}", "type": "quantitative"}}),
+    # 32. Bar Time
+    ChartTemplate("time_series", (T, N), "bar_t_{num}", "Daily/Unit: {num}", "Values per time unit.", "bar",
+        {"x": {"field": "{t}", "type": "temporal"}, "y": {"field": "{num}", "type": "quantitative"}}),
+
+    # --- 6. MULTIVARIATE (3+ VARS) ---
+    # 33. Bubble Colored
+    ChartTemplate("three_numeric", (N, N, N), "bub_col_{x}_{y}_{z}", "Bubble 3Var", "{x}/{y} sized by {z}", "circle",
+        {"x": {"field": "{x}", "type": "quantitative"}, "y": {"field": "{y}", "type": "quantitative"}, "size": {"field": "{z}", "type": "quantitative"}}),
+    # 34. Scatter Colored
+    ChartTemplate("three_numeric", (N, N, N), "scat_col_{x}_{y}_{z}", "Scatter Color", "{x}/{y} colored by {z}", "point",
+        {"x": {"field": "{x}", "type": "quantitative"}, "y": {"field": "{y}", "type": "quantitative"}, "color": {"field": "{z}", "type": "quantitative"}}),
+    # 35. Scatter Colored Categories
+    ChartTemplate("two_numeric_categorical", (N, N, C), "scat_cat_{x}_{y}_{c}", "Grouped Scatter", "{x}/{y} by {c}", "point",
+        {"x": {"field": "{x}", "type": "quantitative"}, "y": {"field": "{y}", "type": "quantitative"}, "color": {"field": "{c}", "type": "nominal"}}),
+    # 36. Stacked Bar (if y is Agg)
+    ChartTemplate("two_numeric_categorical", (N, N, C), "bar_stack_{x}_{c}", "Stacked Bar", "Sum of {x} by {c}", "bar",
+        {"x": {"field": "{c}", "type": "nominal"}, "y": {"field": "{x}", "aggregate": "sum"}, "color": {"field": "{c}", "type": "nominal"}}), # Simplistic stack
+    # 37. Normalized Bar
+    ChartTemplate("two_numeric_categorical", (N, N, C), "bar_norm_{x}_{c}", "Norm Bar", "Example Norm", "bar",
+        {"x": {"field": "{c}", "type": "nominal"}, "y": {"field": "{x}", "aggregate": "sum", "stack": "normalize"}, "color": {"field": "{c}"}}),
+    # 38. Faceted Scatter
+    ChartTemplate("two_numeric_categorical", (N, N, C), "facet_scat_{x}_{y}_{c}", "Faceted: {c}", "Scatter split by {c}", "point",
+        {"x": {"field": "{x}"}, "y": {"field": "{y}"}, "row": {"field": "{c}"}}),
+    # 39. Line Multi-Series (if index is implicitly 2nd numeric acting as time/seq?? No, need time)
+    # 40. Multi-Line
+    ChartTemplate("time_categorical", (T, C, N), "mline_{t}_{c}", "Multi-Line", "Trends by {c}", "line",
+        {"x": {"field": "{t}", "type": "temporal"}, "y": {"field": "{n}"}, "color": {"field": "{c}"}}),
+    # 41. Streamgraph (Stacked Area Center)
+    ChartTemplate("time_categorical", (T, C, N), "stream_{t}_{c}", "Streamgraph", "Flow of {c}", "area",
+        {"x": {"field": "{t}", "type": "temporal"}, "y": {"field": "{n}", "aggregate": "sum", "stack": "center"}, "color": {"field": "{c}"}}),
+    # 42. Stacked Area
+    ChartTemplate("time_categorical", (T, C, N), "st_area_{t}_{c}", "Stacked Area", "Cumulative {c}", "area",
+        {"x": {"field": "{t}", "type": "temporal"}, "y": {"field": "{n}", "aggregate": "sum", "stack": "zero"}, "color": {"field": "{c}"}}),
+
+    # --- 7. FALLBACK / VARIATIONS TO REACH 45 ---
+    # 43. Square Mark
+    ChartTemplate("first_numeric", (N,), "sq_{col}", "Square Plot", "Simple square mark.", "square",
+        {"x": {"field": "{col}", "bin": True}, "y": {"aggregate": "count"}}),
+    # 44. Rule Plot 1D
+    ChartTemplate("first_numeric", (N,), "rule_{col}", "Rug Plot", "1D distribution.", "rule",
+        {"x": {"field": "{col}"}}),
+    # 45. Text Mark (Word Cloudish)
+    ChartTemplate("first_categorical", (C,), "text_{col}", "Text Cloud", "Labels.", "text",
+        {"text": {"field": "{col}"}, "color": {"field": "{col}"}}),
+]
+
+# Templates grouped by binding (in registry order) and indexed by their
+# sorted column-type requirement tuple.
+TEMPLATES_BY_BINDING: Dict[str, List[ChartTemplate]] = {name: [] for name, _ in BINDINGS}
+TEMPLATE_INDEX: Dict[Tuple[str, ...], List[ChartTemplate]] = {}
+for _t in TEMPLATES:
+    _t.position = len(TEMPLATES_BY_BINDING[_t.binding])
+    TEMPLATES_BY_BINDING[_t.binding].append(_t)
+    TEMPLATE_INDEX.setdefault(_t.key, []).append(_t)
+
+
+def match_templates(columns: Dict[str, Dict[str, Any]], n_rows: int) -> Iterator[Tuple[ChartTemplate, Dict[str, Any]]]:
+    """
+    Lazily yields (template, binding) pairs for every candidate chart the
+    column profile supports, in registry order. Only templates whose type
+    requirements are met by the profile are considered; bindings are not
+    enumerated for bindings with no applicable template.
+    """
+    cols = {N: [], C: [], T: []}
+    for col, info in columns.items():
+        cols[info["type"]].append(col)
+    available = Counter({kind: len(names) for kind, names in cols.items()})
+
+    active_keys = {
+        key for key in TEMPLATE_INDEX
+        if all(available[kind] >= need for kind, need in Counter(key).items())
+    }
+
+    for name, bind in BINDINGS:
+        templates = [t for t in TEMPLATES_BY_BINDING[name] if t.key in active_keys]
+        if not templates:
+            continue
+        for binding in bind(cols):
+            for template in templates:
+                if template.when and not PREDICATES[template.when](binding, columns, n_rows):
+                    continue
+                yield template, binding
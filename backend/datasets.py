@@ -0,0 +1,513 @@
+import logging
+import os
+import json
+import uuid
+import pickle
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Union
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from profiler import profile_dataframe, classify_dtype
+from analyzer import analyze_profile, ANALYZER_VERSION, DEFAULT_RECOMMENDATIONS
+from aggregation import Aggregator, aggregate_recommendations, spec_fields, recommendation_fields
+from ingestion import PREVIEW_ROWS, StreamingProfile
+from ranking import sample_size
+from pipeline import load_dataframe
+from serialization import dumps
+from metrics import stage, add_count
+
+logger = logging.getLogger(__name__)
+
+
+SAMPLE_METHODS = ("uniform", "stratified")
+
+# Appended datasets keep exact distinct-value hashes per column up to this
+# many values, then switch to a HyperLogLog sketch (bounded state size).
+STATE_MAX_EXACT = 100_000
+# Rows per chunk when a profile state is first built from stored rows
+STATE_CHUNK_ROWS = 100_000
+
+# One data file path, or the part files of an appended dataset in row order
+Paths = Union[str, List[str]]
+
+
+def part_path(base_path: str, part: int, fmt: str) -> str:
+    """Part 0 is `<base>.<fmt>`; rows appended later live in `<base>.<part>.<fmt>`."""
+    return f"{base_path}.{fmt}" if part == 0 else f"{base_path}.{part}.{fmt}"
+
+
+def dataset_parts(meta: Dict[str, Any]) -> List[str]:
+    """Formats of a dataset's data files, in row order."""
+    return meta.get("parts") or [meta["format"]]
+
+
+def part_paths(base_path: str, meta: Dict[str, Any]) -> List[str]:
+    return [part_path(base_path, i, fmt) for i, fmt in enumerate(dataset_parts(meta))]
+
+
+def state_path(base_path: str) -> str:
+    return base_path + ".state.pkl"
+
+
+def _write_atomic(path: str, write: Callable[[str], Any]):
+    """
+    Calls write(tmp) on a temp file unique to this call, then renames it to
+    `path`. Dataset IDs are content hashes, so concurrent uploads of the
+    same bytes write the same paths at once; each gets its own temp file
+    and the last rename wins with identical content.
+    """
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def write_dataset(df: pd.DataFrame, base_path: str) -> str:
+    """
+    Stores `df` as uncompressed Feather (so it can be memory-mapped on load)
+    at `base_path`.feather, or pickled when the frame has columns Arrow
+    cannot type. Returns the format used.
+    """
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        _write_atomic(base_path + ".feather",
+                      lambda tmp: feather.write_feather(table, tmp, compression="uncompressed"))
+        return "feather"
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    _write_atomic(base_path + ".pkl", df.to_pickle)
+    return "pkl"
+
+
+def _as_paths(path: Paths) -> List[str]:
+    return [path] if isinstance(path, str) else list(path)
+
+
+def _load_table(paths: List[str], columns: Optional[List[str]] = None):
+    """All parts as one memory-mapped Arrow table, or None if any part is pickled."""
+    if not all(p.endswith(".feather") for p in paths):
+        return None
+    tables = [feather.read_table(p, columns=columns, memory_map=True) for p in paths]
+    if len(tables) == 1:
+        return tables[0]
+    # parts typed separately may differ in integer width or dictionary index type
+    return pa.concat_tables(tables, promote_options="permissive")
+
+
+def _load_frame(paths: List[str], columns: Optional[List[str]] = None) -> pd.DataFrame:
+    frames = []
+    for p in paths:
+        df = pd.read_pickle(p) if p.endswith(".pkl") else feather.read_table(p, columns=columns).to_pandas()
+        frames.append(df if columns is None else df[columns])
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+
+def read_dataset(path: Paths, columns: Optional[List[str]] = None,
+                 offset: int = 0, limit: Optional[int] = None) -> pd.DataFrame:
+    """
+    Loads a stored dataset, or the rows [offset, offset + limit) of it.
+    Feather files are memory-mapped and sliced before conversion, so only
+    the requested rows and `columns` are materialized in pandas.
+    """
+    paths = _as_paths(path)
+    table = _load_table(paths, columns)
+    if table is not None:
+        if offset or limit is not None:
+            table = table.slice(offset, limit)
+        return table.to_pandas()
+    df = _load_frame(paths, columns)
+    if offset or limit is not None:
+        df = df.iloc[offset:None if limit is None else offset + limit].reset_index(drop=True)
+    return df
+
+
+def take_rows(path: Paths, indices: np.ndarray, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Rows at `indices` (in that order) from a stored dataset."""
+    paths = _as_paths(path)
+    table = _load_table(paths, columns)
+    if table is not None:
+        return table.take(pa.array(indices, type=pa.int64())).to_pandas()
+    return _load_frame(paths, columns).iloc[indices].reset_index(drop=True)
+
+
+def iter_chunks(path: Paths, rows: int = STATE_CHUNK_ROWS):
+    """A stored dataset as DataFrames of at most `rows` rows, one part at a time."""
+    for p in _as_paths(path):
+        table = _load_table([p])
+        if table is not None:
+            for offset in range(0, max(table.num_rows, 1), rows):
+                yield table.slice(offset, rows).to_pandas()
+        else:
+            df = pd.read_pickle(p)
+            for offset in range(0, max(len(df), 1), rows):
+                yield df.iloc[offset:offset + rows]
+
+
+def stratified_indices(keys: pd.Series, n: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Row positions of a sample of about `n` rows with each distinct value of
+    `keys` (NaN included) represented in proportion to its frequency
+    (largest-remainder rounding).
+    """
+    codes, uniques = pd.factorize(keys, use_na_sentinel=False)
+    counts = np.bincount(codes, minlength=len(uniques))
+    quota = counts * (n / len(keys))
+    alloc = np.minimum(np.floor(quota).astype(np.int64), counts)
+    short = n - int(alloc.sum())
+    if short > 0:
+        # hand the leftover rows to the strata with the largest remainders
+        order = np.argsort(-(quota - alloc), kind="stable")
+        order = order[alloc[order] < counts[order]][:short]
+        alloc[order] += 1
+
+    # Shuffle once, group the shuffled rows by stratum, keep the first alloc[g] of each
+    perm = rng.permutation(len(keys))
+    perm = perm[np.argsort(codes[perm], kind="stable")]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    grouped_codes = codes[perm]
+    rank = np.arange(len(perm)) - starts[grouped_codes]
+    return np.sort(perm[rank < alloc[grouped_codes]])
+
+
+def sample_dataset(path: Paths, n_rows: int, n: int, method: str = "uniform",
+                   by: Optional[str] = None, columns: Optional[List[str]] = None,
+                   seed: int = 0) -> pd.DataFrame:
+    """
+    A representative sample of `n` rows of a stored dataset, in file order.
+    "uniform" draws positions without replacement; "stratified" keeps the
+    proportions of the `by` column. Only the sampled rows are materialized;
+    the same seed returns the same sample.
+    """
+    rng = np.random.default_rng(seed)
+    if n >= n_rows:
+        indices = np.arange(n_rows)
+    elif method == "stratified":
+        indices = stratified_indices(read_dataset(path, columns=[by])[by], n, rng)
+    else:
+        indices = np.sort(rng.choice(n_rows, size=n, replace=False))
+    return take_rows(path, indices, columns)
+
+
+def ingest_dataset(source, filename: str, base_path: str) -> Dict[str, Any]:
+    """
+    Parses an upload once, writes it next to `base_path` and returns its
+    metadata (shape, column profile, on-disk format and size). The store
+    only records the returned metadata; the files are written here.
+    """
+    df = load_dataframe(source, filename)
+    add_count("rows", df.shape[0])
+    add_count("columns", df.shape[1])
+    with stage("store"):
+        fmt = write_dataset(df, base_path)
+    with stage("profile"):
+        columns = profile_dataframe(df)
+    return {
+        "filename": filename,
+        "version": ANALYZER_VERSION,
+        "format": fmt,
+        "parts": [fmt],
+        "shape": list(df.shape),
+        "columns": columns,
+        "bytes": os.path.getsize(f"{base_path}.{fmt}"),
+    }
+
+
+# --- APPEND MODE ---
+
+def appended_id(dataset_id: str, digest: str) -> str:
+    """ID of `dataset_id` plus the upload with content hash `digest` (same append, same ID)."""
+    return hashlib.sha256(f"{dataset_id}:{digest}".encode()).hexdigest()[:32]
+
+
+def load_state(base_path: str, meta: Dict[str, Any]) -> StreamingProfile:
+    """
+    The mergeable profile of a stored dataset (counts, distinct hashes or
+    sketches, min/max, type per column), as persisted by an earlier append.
+    Datasets without one, or with one from another analyzer version, have
+    it built from their rows chunk by chunk and saved for next time.
+    """
+    try:
+        with open(state_path(base_path), "rb") as f:
+            saved = pickle.load(f)
+        if saved.get("version") == ANALYZER_VERSION:
+            return saved["profile"]
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, KeyError):
+        pass
+    state = StreamingProfile(max_exact=STATE_MAX_EXACT)
+    for chunk in iter_chunks(part_paths(base_path, meta)):
+        state.update(chunk)
+    _limit_state(state)
+    save_state(base_path, state)
+    return state
+
+
+def save_state(base_path: str, state: StreamingProfile):
+    def write(tmp):
+        with open(tmp, "wb") as f:
+            pickle.dump({"version": ANALYZER_VERSION, "profile": state}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    _write_atomic(state_path(base_path), write)
+
+
+def _limit_state(state: StreamingProfile):
+    for profile in state.profiles.values():
+        profile.limit_exact(STATE_MAX_EXACT)
+
+
+def conform_rows(df: pd.DataFrame, reference: pd.DataFrame) -> pd.DataFrame:
+    """
+    `df` with the columns of `reference` (in its order) converted to the
+    reference column types, so parts typed separately read back as one
+    table. Values that do not convert become nulls. ValueError if the
+    column sets differ.
+    """
+    missing = [c for c in reference.columns if c not in df.columns]
+    extra = [c for c in df.columns if c not in reference.columns]
+    if missing or extra:
+        raise ValueError("Appended rows must have the dataset's columns"
+                         + (f"; missing: {', '.join(map(str, missing))}" if missing else "")
+                         + (f"; unexpected: {', '.join(map(str, extra))}" if extra else ""))
+    converted = {}
+    for col, dtype in reference.dtypes.items():
+        series = df[col]
+        if series.dtype == dtype:
+            continue
+        kind = classify_dtype(dtype)
+        if kind == "numeric" and classify_dtype(series.dtype) != "numeric":
+            converted[col] = pd.to_numeric(series, errors="coerce")
+        elif kind == "datetime" and classify_dtype(series.dtype) != "datetime":
+            converted[col] = pd.to_datetime(series, errors="coerce")
+        elif kind == "categorical":
+            if classify_dtype(series.dtype) != "categorical":
+                series = series.astype("str").where(series.notna())
+            converted[col] = series.astype("category") if isinstance(dtype, pd.CategoricalDtype) else series
+    df = df[list(reference.columns)]
+    if converted:
+        df = df.copy(deep=False)
+        for col, values in converted.items():
+            df[col] = values
+    return df
+
+
+def _link(src: str, dst: str):
+    """Hard-links `src` to `dst` (a copy where links are unsupported); the files never change after writing."""
+    def link(tmp):
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)
+    _write_atomic(dst, link)
+
+
+def append_dataset(parent_base: str, meta: Dict[str, Any], source, filename: str,
+                   base_path: str) -> Dict[str, Any]:
+    """
+    Stores the parent dataset plus the rows of an upload as a new dataset
+    at `base_path` and returns its metadata. The parent's data files are
+    hard-linked, never rewritten; the new rows become one more part file,
+    and the parent's persisted profile state is merged with a profile of
+    the new rows only, so the cost follows the size of the upload. The
+    parent itself is left unchanged. FileNotFoundError if the parent's
+    files are gone (evicted).
+    """
+    parent_paths = part_paths(parent_base, meta)
+    delta = load_dataframe(source, filename)
+    delta = conform_rows(delta, read_dataset(parent_paths, limit=0))
+    add_count("rows", delta.shape[0])
+    add_count("columns", delta.shape[1])
+
+    with stage("load"):
+        state = load_state(parent_base, meta)
+    with stage("profile"):
+        state.update(delta)
+        _limit_state(state)
+
+    parts = dataset_parts(meta)
+    with stage("store"):
+        for i, (fmt, src) in enumerate(zip(parts, parent_paths)):
+            _link(src, part_path(base_path, i, fmt))
+        parts = parts + [write_dataset(delta, f"{base_path}.{len(parts)}")]
+        save_state(base_path, state)
+
+    paths = part_paths(base_path, {"parts": parts})
+    return {
+        "filename": meta["filename"],
+        "version": ANALYZER_VERSION,
+        "format": parts[0],
+        "parts": parts,
+        "parent": os.path.basename(parent_base),
+        "appended_rows": len(delta),
+        "shape": list(state.shape),
+        "columns": state.columns(),
+        "bytes": sum(os.path.getsize(p) for p in paths + [state_path(base_path)]),
+    }
+
+
+def analyze_dataset(path: Paths, meta: Dict[str, Any],
+                    max_recommendations: int = DEFAULT_RECOMMENDATIONS,
+                    aggregate: bool = False, limit: int = PREVIEW_ROWS) -> Dict[str, Any]:
+    """
+    /analyze-data for a stored dataset. Recommendations come from the
+    profile saved at upload, ranked on a row sample; otherwise rows are only
+    read for `aggregate` (just the columns the recommendations use) and for
+    the preview slice.
+    """
+    columns = {col: dict(info) for col, info in meta["columns"].items()}
+    n_rows, width = meta["shape"]
+    with stage("load"):
+        sample = sample_dataset(path, n_rows, sample_size(width))
+    with stage("recommend"):
+        result = analyze_profile(columns, (n_rows, width), max_recommendations=max_recommendations,
+                                 sample=sample)
+    if aggregate:
+        fields = [f for f in recommendation_fields(result["recommendations"]) if f in columns]
+        with stage("load"):
+            df = read_dataset(path, columns=fields)
+        add_count("rows", len(df))
+        with stage("aggregate"):
+            aggregate_recommendations(df, result)
+    with stage("load"):
+        result["preview"] = read_dataset(path, limit=limit)
+    return result
+
+
+def chart_data(path: Paths, meta: Dict[str, Any], rec: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Aggregates one recommendation over a stored dataset, reading only the
+    columns the spec uses. None if the spec has nothing to aggregate.
+    """
+    fields = [f for f in spec_fields(rec) if f in meta["columns"]]
+    if not fields:
+        return None
+    with stage("load"):
+        df = read_dataset(path, columns=fields)
+    add_count("rows", len(df))
+    add_count("columns", len(fields))
+    with stage("aggregate"):
+        return Aggregator(df, meta["columns"]).aggregate(rec)
+
+
+class DatasetStore:
+    """
+    Parsed uploads kept on local disk under an ID, so follow-up requests
+    (re-analysis, preview pages, chart data) skip the upload and the parse.
+
+    Each dataset is one or more data files (appends add parts, see
+    append_dataset), an optional `<id>.state.pkl` profile state and a
+    `<id>.json` metadata sidecar. The
+    index is an LRU over dataset IDs bounded by total bytes on disk and by
+    count; least recently used datasets are deleted first. Existing datasets
+    in `root_dir` are picked up again on start, oldest access first.
+    """
+
+    def __init__(self, root_dir: str, max_bytes: int = 2 << 30, max_datasets: int = 100):
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        self.max_datasets = max_datasets
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # id -> metadata
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        os.makedirs(root_dir, exist_ok=True)
+        self._load_index()
+
+    def base_path(self, dataset_id: str) -> str:
+        """Path without extension that ingest_dataset writes to."""
+        return os.path.join(self.root_dir, dataset_id)
+
+    def data_paths(self, dataset_id: str, meta: Dict[str, Any]) -> List[str]:
+        return part_paths(self.base_path(dataset_id), meta)
+
+    def add(self, dataset_id: str, meta: Dict[str, Any]):
+        with open(self._meta_path(dataset_id), "wb") as f:
+            f.write(dumps(meta))  # datetime min/max as ISO strings
+        with self._lock:
+            if dataset_id in self._entries:
+                self._bytes -= self._entries.pop(dataset_id)["bytes"]
+            self._entries[dataset_id] = meta
+            self._bytes += meta["bytes"]
+            self._evict(keep=dataset_id)
+
+    def get(self, dataset_id: str) -> Optional[Dict[str, Any]]:
+        """Metadata for a dataset (marking it recently used), or None."""
+        with self._lock:
+            meta = self._entries.get(dataset_id)
+            if meta is None:
+                return None
+            self._entries.move_to_end(dataset_id)
+        try:
+            os.utime(self._meta_path(dataset_id))  # access order survives a restart
+        except OSError:
+            pass
+        return meta
+
+    def remove(self, dataset_id: str) -> bool:
+        with self._lock:
+            if dataset_id not in self._entries:
+                return False
+            self._drop(dataset_id)
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "datasets": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "max_datasets": self.max_datasets,
+                "evictions": self.evictions,
+            }
+
+    # --- internals ---
+
+    def _meta_path(self, dataset_id: str) -> str:
+        return os.path.join(self.root_dir, f"{dataset_id}.json")
+
+    def _evict(self, keep: Optional[str] = None):
+        while len(self._entries) > 1 and (self._bytes > self.max_bytes
+                                          or len(self._entries) > self.max_datasets):
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _drop(self, dataset_id: str):
+        meta = self._entries.pop(dataset_id)
+        self._bytes -= meta["bytes"]
+        # A worker still reading a memory-mapped file keeps its mapping valid;
+        # parts hard-linked into other datasets stay on disk for them
+        paths = self.data_paths(dataset_id, meta) + [state_path(self.base_path(dataset_id)),
+                                                     self._meta_path(dataset_id)]
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _load_index(self):
+        found = []
+        for name in os.listdir(self.root_dir):
+            if not name.endswith(".json"):
+                continue
+            dataset_id = name[:-len(".json")]
+            path = self._meta_path(dataset_id)
+            try:
+                with open(path) as f:
+                    meta = json.load(f)
+                if not all(os.path.exists(p) for p in self.data_paths(dataset_id, meta)):
+                    raise OSError("data file missing")
+                found.append((os.path.getmtime(path), dataset_id, meta))
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Skipping stored dataset %s: %s", dataset_id, e)
+        for _, dataset_id, meta in sorted(found, key=lambda item: item[0]):
+            self._entries[dataset_id] = meta
+            self._bytes += meta["bytes"]
+        self._evict()
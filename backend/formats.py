@@ -0,0 +1,278 @@
+import io
+import zipfile
+from typing import Any, Dict, List, Optional
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+# Bytes read from the start of an upload to identify its format
+SNIFF_BYTES = 16
+
+# Leading bytes -> format. Feather v2 is the Arrow IPC file format.
+MAGIC = [
+    (b"PAR1", "parquet"),
+    (b"ARROW1", "feather"),
+    (b"FEA1", "feather"),
+    (b"\xff\xff\xff\xff", "arrow_stream"),
+    (b"\x1f\x8b", "csv.gz"),
+    (b"\x28\xb5\x2f\xfd", "csv.zst"),
+    (b"PK\x03\x04", "xlsx"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "xls"),
+]
+
+# Plain text is only read as CSV under these names; the content alone cannot
+# tell CSV from JSON, XML or any other text
+TEXT_EXTENSIONS = (".csv",)
+
+CSV_FORMATS = {"csv": None, "csv.gz": "gzip", "csv.zst": "zstd"}  # format -> read_csv compression
+EXCEL_FORMATS = ("xlsx", "xls")
+# What a malformed or empty upload raises while being parsed: pandas parser
+# and Arrow errors are ValueErrors, a broken .xlsx is a bad zip archive, a
+# truncated .gz raises EOFError, and pandas reports a workbook it cannot
+# pick a reader for as an OptionError (a KeyError)
+PARSE_ERRORS = (ValueError, zipfile.BadZipFile, EOFError, OSError, pd.errors.OptionError)
+COLUMNAR_FORMATS = ("parquet", "feather", "arrow_stream")
+
+
+def read_head(source, n: int = SNIFF_BYTES) -> bytes:
+    """First `n` bytes of raw bytes, a path or a seekable file object (rewound)."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source[:n])
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return f.read(n)
+    pos = source.tell()
+    head = source.read(n)
+    source.seek(pos)
+    return head
+
+
+def sniff_format(head: bytes, filename: Optional[str] = None) -> Optional[str]:
+    """
+    Identifies an upload by its magic bytes rather than its file name.
+    Unrecognised text without NUL bytes is plain CSV when `filename` (if
+    given) has a TEXT_EXTENSIONS suffix; None means an unsupported format.
+    """
+    for magic, fmt in MAGIC:
+        if head.startswith(magic):
+            return fmt
+    if b"\x00" in head:
+        return None
+    if filename is not None and not filename.lower().endswith(TEXT_EXTENSIONS):
+        return None
+    return "csv"
+
+
+def _is_workbook(source) -> bool:
+    """
+    Whether a zip upload is an Excel workbook rather than some other zip
+    archive. A zip too broken to list is left to the Excel reader to reject.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    pos = None if isinstance(source, str) else source.tell()
+    try:
+        with zipfile.ZipFile(source) as archive:
+            names = archive.namelist()
+    except zipfile.BadZipFile:
+        return True
+    finally:
+        if pos is not None:
+            source.seek(pos)
+    return "[Content_Types].xml" in names and any(name.startswith("xl/") for name in names)
+
+
+def source_format(source, filename: Optional[str] = None) -> Optional[str]:
+    """
+    sniff_format for a whole upload (bytes, path or seekable file object,
+    rewound): zip archives only count as xlsx when they hold a workbook.
+    """
+    fmt = sniff_format(read_head(source), filename)
+    if fmt == "xlsx" and not _is_workbook(source):
+        return None
+    return fmt
+
+
+def read_frame(source, fmt: str) -> pd.DataFrame:
+    """Parses a whole upload of a sniffed format into a DataFrame."""
+    if fmt in CSV_FORMATS:
+        return pd.read_csv(source, compression=CSV_FORMATS[fmt])
+    if fmt in EXCEL_FORMATS:
+        return pd.read_excel(source)
+    if fmt in COLUMNAR_FORMATS:
+        return ColumnarSource(source, fmt).read()
+    raise ValueError("Unsupported file format")
+
+
+# --- COLUMNAR SOURCES ---
+
+def arrow_column_type(arrow_type) -> str:
+    """Column type (as profiler.classify_dtype would give after to_pandas) of an Arrow type."""
+    if pa.types.is_dictionary(arrow_type):
+        return "categorical"
+    if (pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type)
+            or pa.types.is_decimal(arrow_type) or pa.types.is_boolean(arrow_type)):
+        return "numeric"
+    if pa.types.is_timestamp(arrow_type) or pa.types.is_date(arrow_type):
+        return "datetime"
+    return "categorical"
+
+
+def _to_pandas(table) -> pd.DataFrame:
+    # dates as datetime64 so they profile as "datetime", like parsed CSV dates;
+    # a stored pandas index stays an ordinary column, as profile_columnar sees it
+    return table.to_pandas(date_as_object=False, ignore_metadata=True)
+
+
+class ColumnarSource:
+    """
+    Parquet, Feather (Arrow IPC file) or Arrow IPC stream input read through
+    pyarrow. Row count and schema come from file metadata; data is read per
+    column or as a leading slice, so callers only materialize what they use.
+    Paths are memory-mapped.
+    """
+
+    def __init__(self, source, fmt: str):
+        self.fmt = fmt
+        if isinstance(source, (bytes, bytearray)):
+            source = pa.BufferReader(source)
+        elif isinstance(source, io.BytesIO):
+            source = pa.BufferReader(source.getbuffer())
+        elif isinstance(source, str):
+            source = pa.memory_map(source)
+        self._source = source
+        self._table = None
+
+        if fmt == "parquet":
+            self._parquet = pq.ParquetFile(source)
+            self.schema = self._parquet.schema_arrow
+            self.num_rows = self._parquet.metadata.num_rows
+        elif fmt == "feather":
+            reader = pa.ipc.open_file(source)
+            self.schema = reader.schema
+            self.num_rows = reader.count_rows()
+        else:
+            # a stream has no footer: it is read once, then served from memory
+            self._table = pa.ipc.open_stream(source).read_all()
+            self.schema = self._table.schema
+            self.num_rows = self._table.num_rows
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.schema.names)
+
+    def table(self, columns: Optional[List[str]] = None):
+        """Arrow table of `columns` only (all by default)."""
+        if self._table is not None:
+            return self._table.select(columns) if columns is not None else self._table
+        if self.fmt == "parquet":
+            return self._parquet.read(columns=columns)
+        self._source.seek(0)
+        return feather.read_table(self._source, columns=columns, memory_map=False)
+
+    def read(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        return _to_pandas(self.table(columns))
+
+    def head(self, n: int) -> pd.DataFrame:
+        """The first `n` rows, reading only as many batches as needed."""
+        if n <= 0:
+            return _to_pandas(self.schema.empty_table())
+        if self._table is not None:
+            return _to_pandas(self._table.slice(0, n))
+        if self.fmt == "parquet":
+            batches = []
+            for batch in self._parquet.iter_batches(batch_size=n):
+                batches.append(batch)
+                break
+            table = pa.Table.from_batches(batches, schema=self.schema) if batches else self.schema.empty_table()
+            return _to_pandas(table.slice(0, n))
+        self._source.seek(0)
+        reader = pa.ipc.open_file(self._source)
+        batches, rows = [], 0
+        for i in range(reader.num_record_batches):
+            if rows >= n:
+                break
+            batch = reader.get_batch(i)
+            batches.append(batch)
+            rows += batch.num_rows
+        table = pa.Table.from_batches(batches, schema=self.schema) if batches else self.schema.empty_table()
+        return _to_pandas(table.slice(0, n))
+
+    def statistics(self, column: str) -> Optional[Dict[str, Any]]:
+        """
+        null_count / min / max (and distinct_count when the writer stored
+        one for a single row group) from Parquet metadata, or None if any
+        row group lacks them.
+        """
+        if self.fmt != "parquet":
+            return None
+        meta = self._parquet.metadata
+        index = self._parquet.schema_arrow.get_field_index(column)
+        if index < 0 or meta.num_row_groups == 0:
+            return None
+        # leaf column position in the Parquet schema (flat tables: same as Arrow)
+        if meta.num_columns != len(self.schema.names):
+            return None
+        nulls, lo, hi, distinct = 0, None, None, None
+        for rg in range(meta.num_row_groups):
+            stats = meta.row_group(rg).column(index).statistics
+            if stats is None or not stats.has_min_max or not stats.has_null_count:
+                return None
+            nulls += stats.null_count
+            lo = stats.min if lo is None else min(lo, stats.min)
+            hi = stats.max if hi is None else max(hi, stats.max)
+            if meta.num_row_groups == 1 and stats.has_distinct_count:
+                distinct = stats.distinct_count
+        return {"null_count": nulls, "min": lo, "max": hi, "distinct_count": distinct}
+
+
+def _range_value(value, col_type: str):
+    """Metadata / Arrow min-max scalar as profile_dataframe reports it."""
+    if value is None:
+        return None
+    if col_type == "datetime":
+        return pd.Timestamp(value)
+    return float(value)
+
+
+def profile_columnar(src: ColumnarSource) -> Dict[str, Dict[str, Any]]:
+    """
+    Column profile in the profile_dataframe format, built one column at a
+    time. Types come from the schema; Parquet statistics supply null counts
+    and ranges; only the distinct counts need the column data, and only one
+    column is held in memory at once.
+    """
+    columns = {}
+    for field in src.schema:
+        col_type = arrow_column_type(field.type)
+        stats = src.statistics(field.name)
+        if stats is not None and stats["distinct_count"] is not None:
+            distinct, array = stats["distinct_count"], None
+        else:
+            array = src.table([field.name]).column(0)
+            if pa.types.is_dictionary(field.type):
+                array = array.cast(field.type.value_type)
+            distinct = pc.count_distinct(array).as_py()
+
+        if stats is not None:
+            nulls, lo, hi = stats["null_count"], stats["min"], stats["max"]
+        else:
+            nulls = array.null_count
+            lo = hi = None
+            if col_type != "categorical" and nulls < len(array):
+                bounds = pc.min_max(array)
+                lo, hi = bounds["min"].as_py(), bounds["max"].as_py()
+        if col_type == "categorical" or nulls >= src.num_rows:
+            lo = hi = None
+
+        columns[field.name] = {
+            "type": col_type,
+            "unique_values": int(distinct),
+            "null_count": int(nulls),
+            "min": _range_value(lo, col_type),
+            "max": _range_value(hi, col_type),
+            "approximate": False,
+        }
+    return columns
@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
 import random
+import cv2
 from datetime import datetime, timedelta
 
 def generate_data(rows=200):
@@ -57,6 +58,74 @@ def generate_data(rows=200):
     
     return df
 
+# --- SYNTHETIC DATA FOR BENCHMARKS ---
+
+DTYPES = ("numeric", "categorical", "datetime", "text")
+
+def generate_large_data(rows=10_000, width=8, dtypes=("numeric", "categorical", "datetime"), seed=0):
+    """
+    Vectorized generator for benchmark datasets (millions of rows).
+    Columns cycle through `dtypes`: numeric (alternating float / int),
+    categorical (5-50 labels), datetime (ISO date strings, as read from a
+    CSV) and text (high-cardinality IDs). Same seed -> same frame.
+    """
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2020-01-01")
+    data = {}
+    for i in range(width):
+        kind = dtypes[i % len(dtypes)]
+        name = f"{kind}_{i}"
+        if kind == "numeric":
+            if (i // len(dtypes)) % 2:
+                data[name] = rng.integers(0, 1000, rows)
+            else:
+                data[name] = np.round(rng.lognormal(5, 1, rows), 2)
+        elif kind == "categorical":
+            labels = np.array([f"{name}_label_{k}" for k in range(5 + 5 * (i % 10))])
+            data[name] = labels[rng.integers(0, len(labels), rows)]
+        elif kind == "datetime":
+            days = rng.integers(0, 5 * 365, rows)
+            data[name] = np.datetime_as_string(start + days.astype("timedelta64[D]"), unit="D")
+        elif kind == "text":
+            data[name] = np.char.add("id_", rng.integers(0, rows, rows).astype(str))
+        else:
+            raise ValueError(f"Unknown dtype: {kind}")
+    return pd.DataFrame(data)
+
+def generate_chart_image(kind="bar", width=1280, height=720, seed=0, ext=".png"):
+    """
+    Encoded image of a simple synthetic chart ("bar", "pie" or "line") on a
+    white background, for exercising detect_chart_type.
+    """
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width, 3), 255, np.uint8)
+    left, right, top, bottom = width // 10, width * 9 // 10, height // 10, height * 9 // 10
+    if kind == "bar":
+        n = 8
+        slot = (right - left) // n
+        for k in range(n):
+            h = int(rng.uniform(0.2, 1.0) * (bottom - top))
+            x = left + k * slot + slot // 6
+            cv2.rectangle(img, (x, bottom - h), (x + slot * 2 // 3, bottom), (180, 110, 40), -1)
+    elif kind == "pie":
+        center, radius = (width // 2, height // 2), min(width, height) * 2 // 5
+        angles = np.cumsum(np.concatenate(([0], rng.dirichlet(np.ones(5)) * 360)))
+        for k in range(5):
+            color = tuple(int(c) for c in rng.integers(0, 200, 3))
+            cv2.ellipse(img, center, (radius, radius), 0, angles[k], angles[k + 1], color, -1)
+    elif kind == "line":
+        # rising trend with a little noise, as in a typical time series
+        trend = np.linspace(0.1, 0.9, 12) + rng.uniform(-0.08, 0.08, 12)
+        xs = np.linspace(left, right, 12).astype(np.int32)
+        ys = (bottom - trend * (bottom - top)).astype(np.int32)
+        cv2.polylines(img, [np.stack([xs, ys], axis=1)], False, (40, 40, 200), max(2, width // 400))
+        cv2.line(img, (left, bottom), (right, bottom), (0, 0, 0), 2)
+        cv2.line(img, (left, top), (left, bottom), (0, 0, 0), 2)
+    else:
+        raise ValueError(f"Unknown chart kind: {kind}")
+    ok, buf = cv2.imencode(ext, img)
+    return buf.tobytes()
+
 if __name__ == "__main__":
     df = generate_data(300)
     output_path = "../sample_sales_data.csv"
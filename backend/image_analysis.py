@@ -1,77 +1,194 @@
+import io
+import time
 import cv2
 import numpy as np
+from PIL import Image
+from metrics import add_stage, add_count
 
-def detect_chart_type(image_bytes):
+# Bump when the detector's answers change, so persisted image-cache entries
+# (see image_cache.py) from older code are not served.
+DETECTOR_VERSION = "2"
+
+# Longest side of the image the detector works on. Screenshots are decoded
+# at reduced resolution and/or downsampled to this size; None keeps full size.
+WORK_SIZE = 800
+
+# A HoughCircles candidate only counts as a pie when edges run along at least
+# this share of its circumference. Polyline kinks in line charts produce
+# candidates with ~0.15-0.35 support (more of them at reduced resolution);
+# pie outlines measure ~0.9.
+CIRCLE_SUPPORT = 0.6
+# Radial tolerance of that check, relative to the radius
+CIRCLE_BAND = 0.1
+
+# cv2 decode flags for 1/2, 1/4 and 1/8 resolution grayscale decoding
+_REDUCED_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+]
+
+
+def _header_size(image_bytes):
+    """(width, height) from the image header without decoding pixels, or None."""
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as im:
+            return im.size
+    except Exception:
+        return None
+
+
+def decode_gray(image_bytes, max_side=WORK_SIZE):
+    """
+    Decodes image bytes straight to grayscale, at most `max_side` pixels on
+    the longest side. Uses libjpeg/libpng reduced decoding when the header
+    says the image is large, then INTER_AREA downsampling for the rest.
+    Returns (gray, scale) where scale = working width / original width,
+    or (None, 1.0) if the bytes are not an image.
+    """
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    flag, factor = cv2.IMREAD_GRAYSCALE, 1
+    size = _header_size(image_bytes) if max_side else None
+    if size:
+        for f, reduced in _REDUCED_FLAGS:
+            if max(size) // f >= max_side:
+                flag, factor = reduced, f
+                break
+
+    gray = cv2.imdecode(nparr, flag)
+    if gray is None:
+        return None, 1.0
+    orig_width = size[0] if size else gray.shape[1] * factor
+
+    if max_side:
+        h, w = gray.shape
+        if max(h, w) > max_side:
+            ratio = max_side / max(h, w)
+            gray = cv2.resize(gray, (max(1, int(w * ratio)), max(1, int(h * ratio))),
+                              interpolation=cv2.INTER_AREA)
+    return gray, gray.shape[1] / orig_width
+
+
+def circle_support(edges, circle) -> float:
+    """
+    Share of 180 directions around `circle` (x, y, r) with an edge pixel
+    within CIRCLE_BAND * r of the circumference. Relative to the radius,
+    so it reads the same at any working resolution.
+    """
+    x, y, r = (float(v) for v in circle)
+    angles = np.linspace(0, 2 * np.pi, 180, endpoint=False)[:, None]
+    radii = r * np.linspace(1 - CIRCLE_BAND, 1 + CIRCLE_BAND, int(2 * CIRCLE_BAND * r) + 2)[None, :]
+    xs = np.clip(np.round(x + radii * np.cos(angles)).astype(np.intp), 0, edges.shape[1] - 1)
+    ys = np.clip(np.round(y + radii * np.sin(angles)).astype(np.intp), 0, edges.shape[0] - 1)
+    return float((edges[ys, xs] > 0).any(axis=1).mean())
+
+
+def analyze_chart_image(image_bytes, max_side=WORK_SIZE):
+    """
+    Runs the chart-type detector and reports per-stage timings.
+    Returns {"detected_type", "timings" (ms per stage), "scale", "size"}.
+    Raises ValueError if the bytes cannot be decoded as an image.
+    """
+    timings = {}
+    t0 = time.perf_counter()
+
+    def lap(stage):
+        nonlocal t0
+        now = time.perf_counter()
+        timings[stage] = round((now - t0) * 1000, 3)
+        add_stage(stage, now - t0)
+        t0 = now
+
+    def done(detected):
+        return {"detected_type": detected, "timings": timings, "scale": scale, "size": [width, height]}
+
+    # 1. Decode Image (grayscale, reduced resolution)
+    gray, scale = decode_gray(image_bytes, max_side)
+    lap("decode")
+    add_count("images")
+    add_count("bytes_decoded", len(image_bytes))
+    if gray is None:
+        add_count("decode_errors")
+        # detect_chart_type turns this into its "bar" fallback
+        raise ValueError("Could not decode image")
+    height, width = gray.shape
+
+    # Pixel-count thresholds below were tuned at full resolution; they
+    # shrink with the image. Area and radius cutoffs are already relative.
+    min_area = width * height * 0.002
+
+    # 2. Check for BAR CHART (Rectangles) - Priority over Circle frames
+    # Thresholding
+    _, thresh = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY_INV)
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    rect_count = 0
+    total_contours = 0
+
+    for cnt in contours:
+        # Ignore small dots/noise. The bounding box bounds the area from
+        # above, so most noise is rejected before contourArea / arcLength.
+        _, _, w, h = cv2.boundingRect(cnt)
+        if w * h < min_area or cv2.contourArea(cnt) < min_area:
+            continue
+
+        total_contours += 1
+        peri = cv2.arcLength(cnt, True)
+        approx = cv2.approxPolyDP(cnt, 0.04 * peri, True)
+
+        # If it has 4 vertices (+- error), it's a rectangle
+        # Bars are usually vertical/horizontal rectangles
+        if len(approx) == 4:
+            rect_count += 1
+    lap("contours")
+
+    # Heuristic: If we found distinct rectangles, it's likely a Bar chart
+    # Even if it has a circular frame, the presence of bars is distinctive.
+    if total_contours > 0 and (rect_count >= 3 or (rect_count/total_contours > 0.4)):
+        return done("bar")
+
+    # 3. Check for PIE/DONUT (Circles)
+    # HoughCircles can prove to be too aggressive if there is just a frame.
+    # We only check this if bars weren't found.
+    circles = cv2.HoughCircles(gray, cv2.HOUGH_GRADIENT, dp=1.2, minDist=width/4,
+                               param1=50, param2=30, minRadius=int(min(height, width)*0.1), maxRadius=int(min(height, width)*0.9))
+    lap("hough_circles")
+    # The vote threshold is absolute, so candidates are confirmed against the
+    # edge map (also used for the line check below) at any resolution.
+    edges = cv2.Canny(gray, 50, 150, apertureSize=3)
+    lap("canny")
+
+    if circles is not None and any(circle_support(edges, c) >= CIRCLE_SUPPORT for c in circles[0]):
+        # If we decided it's not a bar, but has a big circle, it's a Pie.
+        return done("arc")
+
+    # 4. Check for LINE CHART
+    # Canny Edges -> Hough Lines
+    lines = cv2.HoughLinesP(edges, 1, np.pi/180, max(30, int(100 * scale)),
+                            minLineLength=width/10, maxLineGap=max(3, 20 * scale))
+    lap("hough_lines")
+
+    if lines is not None and len(lines) > 0:
+        # If valid lines exist that aren't just frame borders...
+        # This is a weak heuristic but better than nothing
+        return done("line")
+
+    # Default Fallback
+    return done("bar")
+
+
+def detect_chart_type(image_bytes, max_side=WORK_SIZE, cache=None):
     """
     Analyzes image bytes using OpenCV to determine the chart type.
     Returns a Vega-Lite mark type: 'arc', 'bar', 'line', 'point', etc.
+    With a `cache` (image_cache.ChartImageCache), repeated and near-identical
+    images are answered by perceptual hash without running the detector.
     """
     try:
-        # 1. Decode Image
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        if img is None:
-            return "bar" # Fallback
-
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        height, width = gray.shape
-
-        # 2. Check for BAR CHART (Rectangles) - Priority over Circle frames
-        # Thresholding
-        _, thresh = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY_INV)
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        rect_count = 0
-        total_contours = 0
-        
-        for cnt in contours:
-            area = cv2.contourArea(cnt)
-            if area < (width * height * 0.002): # Ignore small dots/noise
-                continue
-            
-            total_contours += 1
-            peri = cv2.arcLength(cnt, True)
-            approx = cv2.approxPolyDP(cnt, 0.04 * peri, True)
-            
-            # If it has 4 vertices (+- error), it's a rectangle
-            # Bars are usually vertical/horizontal rectangles
-            if len(approx) == 4:
-                x,y,w,h = cv2.boundingRect(approx)
-                aspect_ratio = float(w)/h
-                # Bars are usually not perfect squares (1.0), but can be
-                rect_count += 1
-                
-        # Heuristic: If we found distinct rectangles, it's likely a Bar chart
-        # Even if it has a circular frame, the presence of bars is distinctive.
-        if total_contours > 0 and (rect_count >= 3 or (rect_count/total_contours > 0.4)):
-            return "bar"
-
-        # 3. Check for PIE/DONUT (Circles)
-        # HoughCircles can prove to be too aggressive if there is just a frame.
-        # We only check this if bars weren't found.
-        circles = cv2.HoughCircles(gray, cv2.HOUGH_GRADIENT, dp=1.2, minDist=width/4,
-                                   param1=50, param2=30, minRadius=int(min(height, width)*0.1), maxRadius=int(min(height, width)*0.9))
-        
-        if circles is not None:
-            # If we decided it's not a bar, but has a big circle, it's a Pie.
-            return "arc"
-
-        # 4. Check for LINE CHART
-        # ... (rest of logic)
-
-        # 4. Check for LINE CHART
-        # Canny Edges -> Hough Lines
-        edges = cv2.Canny(gray, 50, 150, apertureSize=3)
-        lines = cv2.HoughLinesP(edges, 1, np.pi/180, 100, minLineLength=width/10, maxLineGap=20)
-        
-        if lines is not None and len(lines) > 0:
-            # If valid lines exist that aren't just frame borders...
-            # This is a weak heuristic but better than nothing
-            return "line"
-
-        # Default Fallback
-        return "bar"
-
+        if cache is not None:
+            return cache.detect(image_bytes, max_side)["detected_type"]
+        return analyze_chart_image(image_bytes, max_side)["detected_type"]
     except Exception as e:
+        add_count("errors")
         print(f"Error in image analysis: {e}")
         return "bar" # Safe default
@@ -0,0 +1,101 @@
+import asyncio
+import zipfile
+from typing import List, Iterator, Tuple, Callable, AsyncIterator, Optional
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from image_analysis import analyze_chart_image
+from image_cache import ChartImageCache, image_hash, cache_entry
+from workers import WorkerPool, TaskTimeout
+from serialization import dumps
+
+# Zip entries larger than this are reported as errors instead of being read
+MAX_IMAGE_BYTES = 50 << 20
+
+
+def iter_images(files: List[UploadFile]) -> Iterator[Tuple[str, Callable[[], bytes]]]:
+    """
+    Yields (name, read) for every image in the upload: plain files as-is,
+    .zip files expanded entry by entry. `read` loads the bytes only when the
+    image is about to be classified, so a large archive is never held in
+    memory at once.
+    """
+    for upload in files:
+        if upload.filename.lower().endswith(".zip"):
+            upload.file.seek(0)
+            archive = zipfile.ZipFile(upload.file)
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                yield f"{upload.filename}/{info.filename}", _zip_reader(archive, info)
+        else:
+            yield upload.filename, _upload_reader(upload)
+
+
+def _zip_reader(archive: zipfile.ZipFile, info: zipfile.ZipInfo):
+    def read():
+        if info.file_size > MAX_IMAGE_BYTES:
+            raise ValueError(f"Entry is larger than {MAX_IMAGE_BYTES >> 20} MB")
+        return archive.read(info)
+    return read
+
+
+def _upload_reader(upload: UploadFile):
+    def read():
+        upload.file.seek(0)
+        return upload.file.read()
+    return read
+
+
+async def classify_images(pool: WorkerPool, images: Iterator[Tuple[str, Callable[[], bytes]]],
+                          max_side, concurrency: int,
+                          cache: Optional[ChartImageCache] = None) -> AsyncIterator[bytes]:
+    """
+    Classifies images on the worker pool with at most `concurrency` in
+    flight and yields one NDJSON line per image as soon as it finishes
+    (completion order, tagged with the input index). Failures are reported
+    on the image's own line rather than aborting the batch. Images found in
+    `cache` (by perceptual hash) are not sent to the pool.
+    """
+    async def classify(index, name, read):
+        line = {"index": index, "filename": name}
+        try:
+            content = await run_in_threadpool(read)
+            digest = await run_in_threadpool(image_hash, content) if cache is not None else None
+            analysis = await run_in_threadpool(cache.get, digest, max_side) if digest is not None else None
+            if analysis is not None:
+                line.update(detected_type=analysis["detected_type"], timings={}, cached=True)
+            else:
+                analysis = await pool.run(analyze_chart_image, content, max_side, wait=True)
+                if digest is not None:
+                    await run_in_threadpool(cache.put, digest, cache_entry(analysis), max_side)
+                line.update(detected_type=analysis["detected_type"], timings=analysis["timings"],
+                            cached=False)
+        except TaskTimeout:
+            line["error"] = "Analysis timed out"
+        except Exception as e:
+            line["error"] = str(e) or type(e).__name__
+        return dumps(line) + b"\n"
+
+    pending = set()
+    images = enumerate(images)
+    exhausted = False
+    while pending or not exhausted:
+        while not exhausted and len(pending) < concurrency:
+            try:
+                # zip entries are listed off the event loop; None marks the end
+                item = await run_in_threadpool(next, images, None)
+            except Exception as e:
+                # e.g. a corrupt zip: report it and stop reading further input
+                exhausted = True
+                yield dumps({"index": None, "error": f"Could not read upload: {e}"}) + b"\n"
+                break
+            if item is None:
+                exhausted = True
+                break
+            index, (name, read) = item
+            pending.add(asyncio.ensure_future(classify(index, name, read)))
+        if not pending:
+            break
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            yield task.result()
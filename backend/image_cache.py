@@ -0,0 +1,256 @@
+import logging
+import os
+import json
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import cv2
+import numpy as np
+from image_analysis import decode_gray, analyze_chart_image, DETECTOR_VERSION, WORK_SIZE
+
+logger = logging.getLogger(__name__)
+
+# dHash of a HASH_SIZE x HASH_SIZE gradient grid: 256 bits
+HASH_SIZE = 16
+# Images are decoded at reduced resolution to at most this side for hashing
+THUMB_SIDE = 128
+# Near-duplicate threshold in differing bits. Re-encoded (JPEG) and resized
+# copies of a chart measure 0-9 apart; different charts 10+.
+MAX_DISTANCE = 6
+
+# Set bits per byte value, for Hamming distances on numpy < 2 (no bitwise_count)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+
+def _hamming(rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Differing bits between each packed row and `query` (uint8 arrays)."""
+    if not hasattr(np, "bitwise_count"):
+        return _POPCOUNT[rows ^ query].sum(axis=1)
+    if rows.shape[1] % 8 == 0:
+        # 64 bits per XOR / popcount instead of 8
+        rows, query = rows.view(np.uint64), query.view(np.uint64)
+    return np.bitwise_count(rows ^ query).sum(axis=1, dtype=np.int64)
+
+
+def image_hash(image_bytes) -> Optional[bytes]:
+    """
+    256-bit difference hash (dHash) of an image: a grayscale thumbnail is
+    shrunk to 17x16 and each bit says whether a pixel is brighter than its
+    left neighbour. Survives re-encoding and rescaling. None if the bytes
+    are not an image.
+    """
+    gray, _ = decode_gray(image_bytes, THUMB_SIDE)
+    if gray is None:
+        return None
+    thumb = cv2.resize(gray, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    return np.packbits(thumb[:, 1:] > thumb[:, :-1]).tobytes()
+
+
+def cache_entry(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """The part of an analyze_chart_image result worth keeping for look-alike images."""
+    return {"detected_type": analysis["detected_type"], "size": analysis["size"]}
+
+
+class _HashIndex:
+    """
+    The stored hashes of one detection mode as rows of a growable uint8
+    matrix, kept in step with the cache on every insert and eviction
+    (evicted rows are filled with the last row), so a near-duplicate
+    lookup is one vectorized XOR + popcount over all rows.
+    """
+
+    def __init__(self, n_bytes: int):
+        self.rows = np.empty((64, n_bytes), dtype=np.uint8)
+        self.keys: list = []
+        self.pos: Dict[Any, int] = {}
+
+    def add(self, key):
+        if key in self.pos:
+            return
+        n = len(self.keys)
+        if n == len(self.rows):
+            self.rows = np.concatenate([self.rows, np.empty_like(self.rows)])
+        self.rows[n] = np.frombuffer(key[1], dtype=np.uint8)
+        self.pos[key] = n
+        self.keys.append(key)
+
+    def remove(self, key):
+        i = self.pos.pop(key)
+        last = self.keys.pop()
+        if last != key:
+            self.rows[i] = self.rows[len(self.keys)]
+            self.keys[i] = last
+            self.pos[last] = i
+
+    def nearest(self, digest: bytes, max_distance: int):
+        """(key, distance) of the closest stored hash within `max_distance` bits, or None."""
+        if not self.keys:
+            return None
+        distances = _hamming(self.rows[:len(self.keys)], np.frombuffer(digest, dtype=np.uint8))
+        best = int(np.argmin(distances))
+        return self.keys[best] if distances[best] <= max_distance else None
+
+
+class ChartImageCache:
+    """
+    LRU cache of chart-detection results keyed by perceptual image hash, so
+    repeated and near-identical screenshots skip the OpenCV pipeline.
+
+    Lookups try the exact hash first, then the closest stored hash within
+    `max_distance` bits (a vectorized Hamming scan over all entries of the
+    same detection mode); a near hit is also stored under its own hash, so
+    the same look-alike is an exact hit next time. With `path`, entries are
+    also appended to a JSON lines file and replayed on start; the file is
+    compacted when it grows to twice the entry limit.
+    """
+
+    def __init__(self, max_entries: int = 10_000, max_distance: int = MAX_DISTANCE,
+                 path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.path = path
+        self._entries: "OrderedDict[Tuple[Any, bytes], Dict[str, Any]]" = OrderedDict()  # (mode, hash) -> result
+        self._index: Dict[Tuple[Any, int], _HashIndex] = {}  # (mode, hash length) -> index
+        self._lock = threading.Lock()
+        self._log_lines = 0
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path:
+            self._load()
+
+    def get(self, digest: bytes, mode=None) -> Optional[Dict[str, Any]]:
+        """Cached result for an image hash (or a near-duplicate of it), or None."""
+        with self._lock:
+            key = (mode, digest)
+            result = self._entries.get(key)
+            if result is not None:
+                self.hits += 1
+            elif self.max_distance > 0:
+                index = self._index.get((mode, len(digest)))
+                near = index.nearest(digest, self.max_distance) if index is not None else None
+                if near is not None:
+                    result = self._entries[near]
+                    self.near_hits += 1
+                    self._entries.move_to_end(near)
+                    # memory only: the log keeps the original entry
+                    self._store(key, result)
+                    return result
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            return result
+
+    def detect(self, image_bytes, max_side=WORK_SIZE) -> Dict[str, Any]:
+        """
+        analyze_chart_image through the cache: a hit returns the stored
+        result without running the detector. Raises ValueError for bytes
+        that are not an image.
+        """
+        digest = image_hash(image_bytes)
+        if digest is None:
+            raise ValueError("Could not decode image")
+        cached = self.get(digest, max_side)
+        if cached is not None:
+            return cached
+        analysis = analyze_chart_image(image_bytes, max_side)
+        result = cache_entry(analysis)
+        self.put(digest, result, max_side)
+        return result
+
+    def put(self, digest: bytes, result: Dict[str, Any], mode=None):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._store((mode, digest), result)
+            self._append_log(mode, digest, result)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.near_hits) / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+    # --- internals (called with the lock held) ---
+
+    def _store(self, key, result):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        else:
+            mode, digest = key
+            index = self._index.get((mode, len(digest)))
+            if index is None:
+                index = self._index[(mode, len(digest))] = _HashIndex(len(digest))
+            index.add(key)
+        self._entries[key] = result
+        while len(self._entries) > self.max_entries:
+            old, _ = self._entries.popitem(last=False)
+            self._index[(old[0], len(old[1]))].remove(old)
+            self.evictions += 1
+
+    def _append_log(self, mode, digest: bytes, result):
+        if not self.path:
+            return
+        line = {"v": DETECTOR_VERSION, "mode": mode, "hash": digest.hex(), "result": result}
+        try:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(line) + "\n")
+            self._log_lines += 1
+            if self._log_lines > 2 * self.max_entries:
+                self._compact()
+        except OSError as e:
+            logger.warning("Image cache write failed: %s", e)
+
+    def _compact(self):
+        # unique temp file next to the log, so processes sharing it never write the same one
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                for (mode, digest), result in self._entries.items():
+                    f.write(json.dumps({"v": DETECTOR_VERSION, "mode": mode, "hash": digest.hex(),
+                                        "result": result}) + "\n")
+            os.replace(tmp, self.path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self._log_lines = len(self._entries)
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    self._log_lines += 1
+                    try:
+                        entry = json.loads(line)
+                        if entry["v"] != DETECTOR_VERSION:
+                            continue  # produced by an older detector
+                        self._store((entry["mode"], bytes.fromhex(entry["hash"])), entry["result"])
+                    except (ValueError, KeyError, TypeError):
+                        continue  # e.g. a line cut short by a crash
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.warning("Image cache load failed: %s", e)
+            return
+        self.evictions = 0
+        if self._log_lines > len(self._entries):
+            try:
+                self._compact()
+            except OSError as e:
+                logger.warning("Image cache compaction failed: %s", e)
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+# Non-null values inspected per column to choose a conversion
+SAMPLE_ROWS = 1000
+
+# Text columns with few distinct sampled values are stored as `category`
+CATEGORY_MAX_UNIQUE = 100
+CATEGORY_MAX_RATIO = 0.5
+
+# Tried in order; the first format that parses every sampled value wins.
+# Month-first is tried before day-first for ambiguous slash dates.
+DATETIME_FORMATS = [
+    "ISO8601",
+    "%m/%d/%Y", "%d/%m/%Y", "%m/%d/%Y %H:%M", "%d/%m/%Y %H:%M",
+    "%m/%d/%Y %H:%M:%S", "%d/%m/%Y %H:%M:%S",
+    "%d.%m.%Y", "%d.%m.%Y %H:%M", "%d.%m.%Y %H:%M:%S",
+    "%d-%m-%Y", "%Y/%m/%d", "%Y/%m/%d %H:%M:%S",
+    "%d %b %Y", "%b %d, %Y", "%d %B %Y", "%B %d, %Y",
+]
+
+# column -> (kind, datetime format or None); kind is "datetime", "numeric",
+# "category" or "downcast"
+TypePlan = Dict[str, Tuple[str, Optional[str]]]
+
+
+def _is_text(dtype) -> bool:
+    return not (pd.api.types.is_numeric_dtype(dtype)
+                or pd.api.types.is_datetime64_any_dtype(dtype)
+                or isinstance(dtype, pd.CategoricalDtype))
+
+
+def sample_values(series: pd.Series, n: int) -> pd.Series:
+    """Up to `n` non-null values spread evenly over the column."""
+    values = series.dropna()
+    if len(values) > n:
+        values = values.iloc[np.linspace(0, len(values) - 1, n).astype(np.int64)]
+    return values
+
+
+def detect_datetime_format(sample: pd.Series) -> Optional[str]:
+    # Every supported layout has digits; plain labels are rejected up front
+    probe = sample.iloc[:8]
+    if not all(any(ch.isdigit() for ch in value) for value in probe):
+        return None
+    for fmt in DATETIME_FORMATS:
+        try:
+            # a few values first: most wrong formats fail there, cheaply
+            pd.to_datetime(probe, format=fmt)
+            pd.to_datetime(sample, format=fmt)
+        except (ValueError, TypeError, OverflowError):
+            continue
+        return fmt
+    return None
+
+
+def infer_plan(df: pd.DataFrame, sample_rows: int = SAMPLE_ROWS,
+               categories: bool = True, downcast: bool = True) -> TypePlan:
+    """
+    Decides a conversion for each column from a sample of its values:
+    text that parses as dates (with the detected format) or numbers, other
+    low-cardinality text as `category`, and integer columns that fit a
+    smaller integer type. Columns that need nothing are left out.
+    """
+    plan: TypePlan = {}
+    for col, dtype in df.dtypes.items():
+        if pd.api.types.is_integer_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+            if downcast and dtype.itemsize > 1:
+                plan[col] = ("downcast", None)
+            continue
+        if not _is_text(dtype):
+            continue
+
+        sample = sample_values(df[col], sample_rows)
+        if sample.empty or pd.api.types.infer_dtype(sample, skipna=True) != "string":
+            continue
+        if pd.to_numeric(sample, errors="coerce").notna().all():
+            plan[col] = ("numeric", None)
+            continue
+        fmt = detect_datetime_format(sample)
+        if fmt is not None:
+            plan[col] = ("datetime", fmt)
+        elif categories:
+            unique = sample.nunique()
+            if unique <= CATEGORY_MAX_UNIQUE and unique <= len(sample) * CATEGORY_MAX_RATIO:
+                plan[col] = ("category", None)
+    return plan
+
+
+def _convert(series: pd.Series, kind: str, fmt: Optional[str]) -> pd.Series:
+    if kind == "datetime":
+        return pd.to_datetime(series, format=fmt, errors="coerce")
+    return pd.to_numeric(series, errors="coerce")
+
+
+def unparsed(series: pd.Series, kind: str, fmt: Optional[str]) -> pd.Series:
+    """The non-null values of `series` that a date or number conversion turns into nulls."""
+    return series[_convert(series, kind, fmt).isna() & series.notna()]
+
+
+def apply_plan(df: pd.DataFrame, plan: TypePlan, strict: bool = True,
+               rejected: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Converts the planned columns of `df` in full. With `strict`, a date or
+    number conversion that would turn any non-null value into a null (the
+    sample missed a differently formatted row) is dropped and the column is
+    kept as text, and its name is appended to `rejected` if given;
+    otherwise such values become nulls.
+    """
+    converted = {}
+    for col, (kind, fmt) in plan.items():
+        if col not in df.columns:
+            continue
+        series = df[col]
+        if kind == "downcast":
+            if pd.api.types.is_integer_dtype(series.dtype):
+                converted[col] = pd.to_numeric(series, downcast="integer")
+            continue
+        if kind == "category":
+            converted[col] = series.astype("category")
+            continue
+        parsed = _convert(series, kind, fmt)
+        if strict and parsed.isna().sum() > series.isna().sum():
+            if rejected is not None:
+                rejected.append(col)
+            continue
+        converted[col] = parsed
+    if not converted:
+        return df
+    df = df.copy(deep=False)
+    for col, values in converted.items():
+        df[col] = values
+    return df
+
+
+def infer_types(df: pd.DataFrame, sample_rows: int = SAMPLE_ROWS) -> pd.DataFrame:
+    """
+    Type-inference stage run after parsing: dates become datetime64 (so the
+    time-series templates apply), numeric text becomes numbers, repetitive
+    text becomes `category` and integers are downcast, all of which also
+    shrink the frame in memory.
+    """
+    return apply_plan(df, infer_plan(df, sample_rows))
@@ -0,0 +1,107 @@
+import io
+import pandas as pd
+from typing import Dict, Any, List, Optional, Union
+from profiler import ColumnProfile
+from inference import infer_plan, apply_plan, unparsed, sample_values, SAMPLE_ROWS
+from metrics import add_count
+
+# Rows per read_csv chunk. Peak memory is roughly one chunk plus the preview.
+DEFAULT_CHUNKSIZE = 50_000
+PREVIEW_ROWS = 5000
+# Streamed columns count distinct values exactly up to this many, then
+# switch to a HyperLogLog sketch, so memory stays bounded for ID-like columns.
+STREAM_MAX_EXACT = 100_000
+# Upper bound for one preview response / page
+MAX_PREVIEW_ROWS = 100_000
+
+
+class StreamingProfile:
+    """
+    Incrementally builds the column profile that analyze_profile() needs
+    from a sequence of dataframe chunks.
+
+    Distinct values are tracked per column as sorted 64-bit value hashes
+    up to `max_exact` values, then as a fixed-size HyperLogLog sketch, so
+    memory is bounded by neither file size nor cardinality; with `approx`,
+    every column uses a sketch from the start.
+    """
+
+    def __init__(self, approx: bool = False, max_exact: Optional[int] = STREAM_MAX_EXACT):
+        self.n_rows = 0
+        self.approx = approx
+        self.max_exact = max_exact
+        self.profiles: Dict[str, ColumnProfile] = {}
+
+    def __setstate__(self, state):
+        state.setdefault("max_exact", None)  # pickled before the cap existed
+        self.__dict__.update(state)
+
+    def update(self, chunk: pd.DataFrame):
+        self.n_rows += len(chunk)
+        for col in chunk.columns:
+            if col not in self.profiles:
+                self.profiles[col] = ColumnProfile(approx=self.approx, max_exact=self.max_exact)
+            self.profiles[col].update(chunk[col])
+
+    def columns(self) -> Dict[str, Dict[str, Any]]:
+        return {col: profile.to_dict() for col, profile in self.profiles.items()}
+
+    @property
+    def shape(self):
+        return (self.n_rows, len(self.profiles))
+
+
+def stream_csv(source: Union[str, bytes], chunksize: int = DEFAULT_CHUNKSIZE, preview_rows: int = PREVIEW_ROWS,
+               approx_distinct: bool = False, compression: Optional[str] = None):
+    """
+    Reads a CSV file (a path, or the raw bytes; gzip / zstd compressed with
+    `compression`) in fixed-size chunks, decompressing as it goes.
+    Returns (StreamingProfile, preview_df) where preview_df holds at most
+    `preview_rows` leading rows; no other rows are retained.
+
+    Date and numeric text columns are detected on the first chunk and every
+    chunk is converted with that plan. A chunk the plan does not fit (a
+    value the sampled format would turn into a null, e.g. 13/01/2024 after
+    only ambiguous dates like 01/02/2024) has those columns detected again
+    with its values included, and the file is read again from the start;
+    a column no format fits stays text, as infer_types would leave it.
+    """
+    plan = None
+    samples: Dict[str, pd.Series] = {}
+
+    while True:
+        profile = StreamingProfile(approx=approx_distinct)
+        preview_parts: List[pd.DataFrame] = []
+        kept = 0
+        rejected: List[str] = []
+
+        fileobj = source if isinstance(source, str) else io.BytesIO(source)
+        for chunk in pd.read_csv(fileobj, chunksize=chunksize, compression=compression):
+            if plan is None:
+                plan = infer_plan(chunk, categories=False, downcast=False)
+                samples = {col: sample_values(chunk[col], SAMPLE_ROWS) for col in plan}
+            converted = apply_plan(chunk, plan, rejected=rejected)
+            if rejected:
+                break
+            profile.update(converted)
+            if kept < preview_rows:
+                part = converted.head(preview_rows - kept)
+                preview_parts.append(part)
+                kept += len(part)
+
+        if not rejected:
+            break
+        add_count("stream_replans")
+        for col in rejected:
+            kind, fmt = plan.pop(col)
+            # the values that failed are kept, so the same format cannot be chosen again
+            samples[col] = pd.concat([samples[col], unparsed(chunk[col], kind, fmt).iloc[:SAMPLE_ROWS],
+                                      sample_values(chunk[col], SAMPLE_ROWS)], ignore_index=True)
+            plan.update(infer_plan(samples[col].to_frame(col), sample_rows=len(samples[col]),
+                                   categories=False, downcast=False))
+
+    if preview_parts:
+        preview = pd.concat(preview_parts, ignore_index=True)
+    else:
+        preview = pd.DataFrame(columns=list(profile.profiles))
+    return profile, preview
@@ -1,11 +1,41 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, Query, Request, Body
 from fastapi.middleware.cors import CORSMiddleware
-import pandas as pd
-import io
-from analyzer import analyze_dataframe
-from image_analysis import detect_chart_type
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, Response
+from contextlib import asynccontextmanager
+import os
+import time
+import shutil
+import tempfile
+from typing import Any, Dict, List, Optional
+from analyzer import ANALYZER_VERSION, DEFAULT_RECOMMENDATIONS
+from ingestion import DEFAULT_CHUNKSIZE, PREVIEW_ROWS, MAX_PREVIEW_ROWS
+from cache import ResultCache, hash_upload
+from serialization import FastJSONResponse, negotiate_format, render_result
+from pipeline import run_analysis
+from formats import source_format, CSV_FORMATS, PARSE_ERRORS
+from datasets import (DatasetStore, ingest_dataset, append_dataset, appended_id, analyze_dataset,
+                      chart_data, read_dataset, sample_dataset, SAMPLE_METHODS)
+from workers import WorkerPool, PoolSaturated, TaskTimeout
+from image_analysis import analyze_chart_image, WORK_SIZE
+from image_batch import iter_images, classify_images
+from image_cache import ChartImageCache, image_hash, cache_entry
+from metrics import Registry, ProfileSampler, collect, start_request, current, stage, add_count
 
-app = FastAPI()
+# CPU-bound parsing/analysis runs here, never on the event loop
+worker_pool = WorkerPool(
+    max_workers=int(os.environ.get("CHARTYAP_WORKERS", "0")) or None,
+    max_queue=int(os.environ["CHARTYAP_QUEUE"]) if "CHARTYAP_QUEUE" in os.environ else None,
+    timeout=float(os.environ.get("CHARTYAP_TASK_TIMEOUT", "120")),
+    kind=os.environ.get("CHARTYAP_POOL", "process"),
+)
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    worker_pool.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS for frontend
 app.add_middleware(
@@ -16,50 +46,422 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Analysis results keyed by upload content hash (see cache.py)
+result_cache = ResultCache(
+    max_bytes=int(os.environ.get("CHARTYAP_CACHE_MB", "256")) << 20,
+    ttl=float(os.environ.get("CHARTYAP_CACHE_TTL", "3600")),
+    disk_dir=os.environ.get("CHARTYAP_CACHE_DIR") or None,
+    disk_max_bytes=int(os.environ.get("CHARTYAP_CACHE_DISK_MB", "2048")) << 20,
+)
+
+# Chart-type results keyed by perceptual image hash (see image_cache.py);
+# CHARTYAP_IMAGE_CACHE=0 disables it
+image_cache = ChartImageCache(
+    max_entries=int(os.environ.get("CHARTYAP_IMAGE_CACHE", "10000")),
+    max_distance=int(os.environ.get("CHARTYAP_IMAGE_HASH_DISTANCE", "6")),
+    path=os.environ.get("CHARTYAP_IMAGE_CACHE_FILE") or None,
+)
+
+# Parsed uploads kept on disk under a dataset ID (see datasets.py)
+dataset_store = DatasetStore(
+    root_dir=os.environ.get("CHARTYAP_DATA_DIR") or os.path.join(tempfile.gettempdir(), "chartyap-datasets"),
+    max_bytes=int(os.environ.get("CHARTYAP_DATA_MB", "2048")) << 20,
+    max_datasets=int(os.environ.get("CHARTYAP_MAX_DATASETS", "100")),
+)
+
+# Request metrics for /metrics, plus opt-in cProfile dumps of slow requests
+# (set CHARTYAP_PROFILE_MS to enable; see metrics.py)
+metrics_registry = Registry()
+metrics_registry.gauges = {
+    "cache": result_cache.stats,
+    "image_cache": image_cache.stats,
+    "workers": worker_pool.stats,
+    "datasets": dataset_store.stats,
+}
+profile_sampler = ProfileSampler(
+    threshold_ms=float(os.environ["CHARTYAP_PROFILE_MS"]) if os.environ.get("CHARTYAP_PROFILE_MS") else None,
+    rate=float(os.environ.get("CHARTYAP_PROFILE_RATE", "0.1")),
+    out_dir=os.environ.get("CHARTYAP_PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "chartyap-profiles"),
+)
+
+@app.middleware("http")
+async def instrument_request(request: Request, call_next):
+    """
+    Records per-stage timings and sizes for every request, reports them in
+    a Server-Timing header and adds them to the /metrics histograms.
+    """
+    request_metrics = start_request()
+    if request.headers.get("content-length"):
+        request_metrics.add_count("bytes_in", int(request.headers["content-length"]))
+    t0 = time.perf_counter()
+    with profile_sampler.profiled(f"{request.method} {request.url.path}"):
+        response = await call_next(request)
+    elapsed = time.perf_counter() - t0
+
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    size = response.headers.get("content-length")
+    metrics_registry.observe_request(route, request.method, response.status_code, elapsed,
+                                     request_metrics, int(size) if size else None)
+    response.headers["Server-Timing"] = request_metrics.server_timing(elapsed)
+    return response
+
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
 
+@app.get("/cache/stats")
+def cache_stats():
+    return result_cache.stats()
+
+@app.get("/image-cache/stats")
+def image_cache_stats():
+    return image_cache.stats()
+
+@app.get("/workers/stats")
+def worker_stats():
+    return worker_pool.stats()
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus text exposition of request, stage and size metrics."""
+    return Response(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+async def run_in_pool(fn, *args, **kwargs):
+    """
+    Runs `fn` on the worker pool, translating saturation into 503 (with
+    Retry-After) and timeouts into 504. Returns (result, error_response).
+    Stages recorded inside the worker are merged into the request's metrics;
+    time between submitting and the worker finishing is reported as "queue".
+    """
+    t0 = time.perf_counter()
+    try:
+        result, worker_metrics, worker_seconds = await worker_pool.run(
+            collect, fn, args, kwargs, profile_sampler.sample(getattr(fn, "__name__", "task")))
+        request_metrics = current()
+        if request_metrics is not None:
+            request_metrics.merge(worker_metrics)
+            request_metrics.add_stage("queue", max(0.0, time.perf_counter() - t0 - worker_seconds))
+        return result, None
+    except PoolSaturated:
+        return None, FastJSONResponse({"error": "Server busy, retry later"}, status_code=503,
+                                      headers={"Retry-After": "1"})
+    except TaskTimeout:
+        return None, FastJSONResponse({"error": "Analysis timed out"}, status_code=504)
+
+def _unreadable_upload(e: Exception):
+    return FastJSONResponse({"error": f"Could not read file: {e}"}, status_code=400)
+
+def _spool_to_disk(fileobj) -> str:
+    """
+    Copies an upload to a named temp file. Workers get the path and read
+    the file themselves (streaming a CSV, memory-mapping a columnar file)
+    instead of receiving its bytes pickled.
+    """
+    fileobj.seek(0)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".upload") as tmp:
+        shutil.copyfileobj(fileobj, tmp, 1 << 20)
+    return tmp.name
+
 @app.post("/analyze-data")
-async def analyze_data_endpoint(file: UploadFile = File(...)):
-    contents = await file.read()
-    
-    # Simple loader for CSV and Excel
-    if file.filename.endswith('.csv'):
-        df = pd.read_csv(io.BytesIO(contents))
-    elif file.filename.endswith(('.xls', '.xlsx')):
-        df = pd.read_excel(io.BytesIO(contents))
-    else:
+async def analyze_data_endpoint(
+    request: Request,
+    file: UploadFile = File(...),
+    stream: bool = Query(False, description="Read CSV uploads in chunks instead of all at once"),
+    chunksize: int = Query(DEFAULT_CHUNKSIZE, ge=1000),
+    approx_distinct: bool = Query(False, description="Use HyperLogLog distinct counts for high-cardinality columns"),
+    max_recommendations: int = Query(DEFAULT_RECOMMENDATIONS, ge=1, le=100),
+    aggregate: bool = Query(False, description="Ship each recommendation with data pre-aggregated over the full file"),
+    format: Optional[str] = Query(None, description="Preview layout: records (default), columnar or arrow"),
+    limit: int = Query(PREVIEW_ROWS, ge=0, le=MAX_PREVIEW_ROWS, description="Preview rows to return (0 for none)"),
+):
+    fmt = negotiate_format(format, request.headers.get("accept"))
+    # The format comes from the leading bytes, not the file name
+    file_format = source_format(file.file, file.filename)
+    if file_format is None:
         return {"error": "Unsupported file format"}
+    stream = stream and file_format in CSV_FORMATS
+
+    # Same bytes + same analyzer + same options -> same result
+    with stage("hash"):
+        digest = await run_in_threadpool(hash_upload, file.file)
+    cache_key = ":".join([
+        ANALYZER_VERSION, digest, file_format,
+        f"stream={stream}", f"chunksize={chunksize}", f"approx={approx_distinct}",
+        f"n={max_recommendations}", f"agg={aggregate}", f"limit={limit}",
+    ])
+    with stage("cache"):
+        cached = await run_in_threadpool(result_cache.get, cache_key)
+    if cached is not None:
+        with stage("serialize"):
+            return render_result(cached, fmt)
+
+    options = dict(stream=stream, chunksize=chunksize, approx_distinct=approx_distinct,
+                   max_recommendations=max_recommendations, aggregate=aggregate, limit=limit)
+    with stage("spool"):
+        path = await run_in_threadpool(_spool_to_disk, file.file)
+    try:
+        result, error = await run_in_pool(run_analysis, path, file.filename, **options)
+    except PARSE_ERRORS as e:  # empty or malformed file
+        return _unreadable_upload(e)
+    finally:
+        os.remove(path)
+    if error is not None:
+        return error
 
-    # Run analysis
-    result = analyze_dataframe(df)
-    
-    # Return data for frontend visualization (Limit to 5000 rows to prevent payload issues)
-    # Convert all columns to compatible types (e.g. usage of NaN)
-    df_clean = df.fillna(0) # Simple fill na for visualization safety
-    limit = 5000
-    if len(df_clean) > limit:
-        result["preview"] = df_clean.head(limit).to_dict(orient="records")
-    else:
-        result["preview"] = df_clean.to_dict(orient="records")
-    
-    return result
+    with stage("cache"):
+        await run_in_threadpool(result_cache.put, cache_key, result)
+    with stage("serialize"):
+        return render_result(result, fmt)
 
 @app.post("/analyze-image")
-async def analyze_image_endpoint(file: UploadFile = File(...)):
+async def analyze_image_endpoint(
+    file: UploadFile = File(...),
+    full_resolution: bool = Query(False, description="Run detection on the full-size image instead of the downscaled fast path"),
+):
     try:
         content = await file.read()
-        detected_type = detect_chart_type(content)
+        max_side = None if full_resolution else WORK_SIZE
+        # Repeated and look-alike screenshots are answered by perceptual hash
+        with stage("hash"):
+            digest = await run_in_threadpool(image_hash, content)
+        with stage("cache"):
+            analysis = await run_in_threadpool(image_cache.get, digest, max_side) if digest is not None else None
+        cached = analysis is not None
+        if digest is None:
+            # Not an image: detect_chart_type's "bar" fallback, as before the cache
+            add_count("decode_errors")
+            analysis = {"detected_type": "bar", "timings": {}}
+        elif not cached:
+            analysis, error = await run_in_pool(analyze_chart_image, content, max_side)
+            if error is not None:
+                return error
+            await run_in_threadpool(image_cache.put, digest, cache_entry(analysis), max_side)
+        detected_type = analysis["detected_type"]
         
         return {
             "filename": file.filename,
             "detected_type": detected_type, 
-            "message": f"Successfully analyzed image. Detected style: {detected_type}"
+            "message": f"Successfully analyzed image. Detected style: {detected_type}",
+            "timings": analysis.get("timings", {}),
+            "cached": cached,
         }
     except Exception as e:
         return {"error": str(e)}
 
+@app.post("/analyze-images")
+async def analyze_images_endpoint(
+    files: List[UploadFile] = File(...),
+    full_resolution: bool = Query(False, description="Run detection on the full-size images instead of the downscaled fast path"),
+):
+    """
+    Classifies many images (and/or .zip archives of images) in one request.
+    Streams one NDJSON line per image as it finishes; a bad image gets an
+    "error" field on its line instead of failing the batch.
+    """
+    lines = classify_images(worker_pool, iter_images(files),
+                            None if full_resolution else WORK_SIZE,
+                            concurrency=worker_pool.max_workers, cache=image_cache)
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+# --- DATASETS: upload once, then work by ID ---
+
+def _unknown_dataset():
+    return FastJSONResponse({"error": "Unknown dataset"}, status_code=404)
+
+@app.get("/datasets/stats")
+def dataset_stats():
+    return dataset_store.stats()
+
+@app.post("/datasets")
+async def upload_dataset_endpoint(file: UploadFile = File(...)):
+    """
+    Parses an upload once and stores it server-side. The returned
+    dataset_id replaces the file in later /datasets/{id}/... requests.
+    Re-uploading identical bytes returns the existing dataset.
+    """
+    if source_format(file.file, file.filename) is None:
+        return {"error": "Unsupported file format"}
+    with stage("hash"):
+        digest = await run_in_threadpool(hash_upload, file.file)
+    dataset_id = digest[:32]
+
+    meta = dataset_store.get(dataset_id)
+    # Datasets typed and profiled by an older analyzer are parsed again
+    if meta is None or meta.get("version") != ANALYZER_VERSION:
+        with stage("spool"):
+            path = await run_in_threadpool(_spool_to_disk, file.file)
+        try:
+            meta, error = await run_in_pool(ingest_dataset, path, file.filename,
+                                            dataset_store.base_path(dataset_id))
+        except PARSE_ERRORS as e:  # empty or malformed file
+            return _unreadable_upload(e)
+        finally:
+            os.remove(path)
+        if error is not None:
+            return error
+        await run_in_threadpool(dataset_store.add, dataset_id, meta)
+
+    return FastJSONResponse({
+        "dataset_id": dataset_id,
+        "filename": meta["filename"],
+        "shape": meta["shape"],
+        "columns": meta["columns"],
+    })
+
+@app.post("/datasets/{dataset_id}/append")
+async def append_dataset_endpoint(dataset_id: str, file: UploadFile = File(...)):
+    """
+    Appends the rows of an upload with the same columns (e.g. today's new
+    rows of a daily export) to a stored dataset. Only the new rows are
+    parsed and profiled; the stored profile state is merged with theirs.
+    Returns a new dataset_id for the combined rows and leaves the original
+    unchanged, so results cached for it stay valid. Repeating the same
+    append returns the same ID.
+    """
+    meta = dataset_store.get(dataset_id)
+    if meta is None:
+        return _unknown_dataset()
+    if source_format(file.file, file.filename) is None:
+        return {"error": "Unsupported file format"}
+    with stage("hash"):
+        digest = await run_in_threadpool(hash_upload, file.file)
+    new_id = appended_id(dataset_id, digest)
+
+    new_meta = dataset_store.get(new_id)
+    if new_meta is None or new_meta.get("version") != ANALYZER_VERSION:
+        with stage("spool"):
+            path = await run_in_threadpool(_spool_to_disk, file.file)
+        try:
+            new_meta, error = await run_in_pool(append_dataset, dataset_store.base_path(dataset_id), meta,
+                                                path, file.filename, dataset_store.base_path(new_id))
+        except FileNotFoundError:  # evicted while queued
+            return _unknown_dataset()
+        except PARSE_ERRORS as e:  # column mismatch, or an unreadable file
+            return FastJSONResponse({"error": str(e)}, status_code=400)
+        finally:
+            os.remove(path)
+        if error is not None:
+            return error
+        await run_in_threadpool(dataset_store.add, new_id, new_meta)
+
+    return FastJSONResponse({
+        "dataset_id": new_id,
+        "parent": dataset_id,
+        "filename": new_meta["filename"],
+        "appended_rows": new_meta["appended_rows"],
+        "shape": new_meta["shape"],
+        "columns": new_meta["columns"],
+    })
+
+@app.get("/datasets/{dataset_id}/analyze")
+async def analyze_dataset_endpoint(
+    request: Request,
+    dataset_id: str,
+    max_recommendations: int = Query(DEFAULT_RECOMMENDATIONS, ge=1, le=100),
+    aggregate: bool = Query(False, description="Ship each recommendation with data pre-aggregated over the full dataset"),
+    format: Optional[str] = Query(None, description="Preview layout: records (default), columnar or arrow"),
+    limit: int = Query(PREVIEW_ROWS, ge=0, le=MAX_PREVIEW_ROWS, description="Preview rows to return (0 for none)"),
+):
+    fmt = negotiate_format(format, request.headers.get("accept"))
+    meta = dataset_store.get(dataset_id)
+    if meta is None:
+        return _unknown_dataset()
+
+    cache_key = ":".join([ANALYZER_VERSION, "dataset", dataset_id,
+                          f"n={max_recommendations}", f"agg={aggregate}", f"limit={limit}"])
+    with stage("cache"):
+        cached = await run_in_threadpool(result_cache.get, cache_key)
+    if cached is not None:
+        with stage("serialize"):
+            return render_result(cached, fmt)
+
+    try:
+        result, error = await run_in_pool(analyze_dataset, dataset_store.data_paths(dataset_id, meta), meta,
+                                          max_recommendations=max_recommendations, aggregate=aggregate,
+                                          limit=limit)
+    except FileNotFoundError:  # evicted while queued
+        return _unknown_dataset()
+    if error is not None:
+        return error
+    with stage("cache"):
+        await run_in_threadpool(result_cache.put, cache_key, result)
+    with stage("serialize"):
+        return render_result(result, fmt)
+
+@app.get("/datasets/{dataset_id}/preview")
+async def dataset_preview_endpoint(
+    request: Request,
+    dataset_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(PREVIEW_ROWS, ge=1, le=MAX_PREVIEW_ROWS),
+    columns: Optional[str] = Query(None, description="Comma-separated columns to return (default: all)"),
+    sample: Optional[str] = Query(None, description="uniform or stratified: a representative sample of `limit` rows instead of a page"),
+    by: Optional[str] = Query(None, description="Column to stratify on (sample=stratified)"),
+    seed: int = Query(0, description="Sampling seed; the same seed returns the same sample"),
+    format: Optional[str] = Query(None, description="Preview layout: records (default), columnar or arrow"),
+):
+    """
+    One page (rows [offset, offset + limit)) or one sample of a stored
+    dataset, optionally projected to `columns`. Served from the stored
+    file without re-parsing; only the returned rows are read.
+    """
+    fmt = negotiate_format(format, request.headers.get("accept"))
+    meta = dataset_store.get(dataset_id)
+    if meta is None:
+        return _unknown_dataset()
+
+    selected = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+    unknown = [c for c in (selected or []) + ([by] if by else []) if c not in meta["columns"]]
+    if unknown:
+        return FastJSONResponse({"error": f"Unknown columns: {', '.join(unknown)}"}, status_code=400)
+    if sample is not None and sample not in SAMPLE_METHODS:
+        return FastJSONResponse({"error": f"sample must be one of {', '.join(SAMPLE_METHODS)}"}, status_code=400)
+    if sample == "stratified" and not by:
+        return FastJSONResponse({"error": "sample=stratified needs a `by` column"}, status_code=400)
+
+    path = dataset_store.data_paths(dataset_id, meta)
+    total = meta["shape"][0]
+    body = {"dataset_id": dataset_id, "shape": meta["shape"], "sample": sample}
+    try:
+        with stage("load"):
+            if sample:
+                preview = await run_in_threadpool(sample_dataset, path, total, limit, sample,
+                                                  by=by, columns=selected, seed=seed)
+            else:
+                # Memory-mapped slice: only the page's rows are read
+                preview = await run_in_threadpool(read_dataset, path, columns=selected,
+                                                  offset=offset, limit=limit)
+                end = min(offset + limit, total)
+                body.update(offset=offset, limit=limit,
+                            next_offset=end if end < total else None)
+    except FileNotFoundError:
+        return _unknown_dataset()
+    body["preview"] = preview
+    with stage("serialize"):
+        return render_result(body, fmt)
+
+@app.post("/datasets/{dataset_id}/chart-data")
+async def dataset_chart_data_endpoint(dataset_id: str, rec: Dict[str, Any] = Body(...)):
+    """Aggregates one recommendation spec over the full stored dataset."""
+    meta = dataset_store.get(dataset_id)
+    if meta is None:
+        return _unknown_dataset()
+    try:
+        result, error = await run_in_pool(chart_data, dataset_store.data_paths(dataset_id, meta), meta, rec)
+    except FileNotFoundError:
+        return _unknown_dataset()
+    if error is not None:
+        return error
+    if result is None:
+        return FastJSONResponse({"error": "Chart has no server-side aggregation"}, status_code=422)
+    return FastJSONResponse(result)
+
+@app.delete("/datasets/{dataset_id}")
+async def delete_dataset_endpoint(dataset_id: str):
+    if not await run_in_threadpool(dataset_store.remove, dataset_id):
+        return _unknown_dataset()
+    return {"deleted": dataset_id}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,314 @@
+import logging
+import os
+import time
+import random
+import cProfile
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets (seconds) and size buckets (bytes, 1 KB .. 1 GB)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = tuple(1024 * 4 ** k for k in range(11))
+
+
+# --- PER-REQUEST STAGE TIMINGS ---
+
+class RequestMetrics:
+    """
+    Stage durations (seconds) and counts (rows, columns, bytes, ...) for one
+    request. Code anywhere below the endpoint records into the active
+    instance through stage() / add_count() without it being passed around.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, float] = {}
+
+    def add_stage(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_count(self, name: str, value: float = 1):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def merge(self, exported: Dict[str, Dict[str, float]]):
+        for name, seconds in exported.get("stages", {}).items():
+            self.add_stage(name, seconds)
+        for name, value in exported.get("counts", {}).items():
+            self.add_count(name, value)
+
+    def export(self) -> Dict[str, Dict[str, float]]:
+        return {"stages": dict(self.stages), "counts": dict(self.counts)}
+
+    def server_timing(self, total: float) -> str:
+        """Server-Timing header value, durations in milliseconds."""
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar("chartyap_request_metrics", default=None)
+
+
+def start_request() -> RequestMetrics:
+    metrics = RequestMetrics()
+    _current.set(metrics)
+    return metrics
+
+
+def current() -> Optional[RequestMetrics]:
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str):
+    """Times the block as stage `name` of the active request (no-op outside one)."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_stage(name, time.perf_counter() - t0)
+
+
+def add_stage(name: str, seconds: float):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add_stage(name, seconds)
+
+
+def add_count(name: str, value: float = 1):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add_count(name, value)
+
+
+def collect(fn: Callable, args: Tuple = (), kwargs: Optional[Dict[str, Any]] = None,
+            profile: Optional[Dict[str, Any]] = None):
+    """
+    Runs fn(*args, **kwargs) with its own RequestMetrics and returns
+    (result, exported metrics, seconds). The caller merges the exported
+    stages and counts into its own request, so work done in a worker
+    process still shows up in Server-Timing and /metrics; with a
+    `profile` request from ProfileSampler.sample() the call is also run
+    under cProfile and dumped if it was slow.
+    """
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    profiler = _start_profiler() if profile else None
+    t0 = time.perf_counter()
+    try:
+        result = fn(*args, **(kwargs or {}))
+    finally:
+        if profiler is not None:
+            _stop_profiler(profiler)
+        _current.reset(token)
+    elapsed = time.perf_counter() - t0
+    if profiler is not None:
+        dump_profile(profiler, profile, elapsed, "worker")
+    return result, metrics.export(), elapsed
+
+
+# --- PROFILING HOOK ---
+
+# Python 3.12+ allows one active cProfile per interpreter (a second enable()
+# raises ValueError), so every profiled block in this process takes this
+# lock first and is simply not profiled when it is held.
+_profiling = threading.Lock()
+
+
+def _start_profiler() -> Optional[cProfile.Profile]:
+    """An enabled profiler, or None if another profile is already running."""
+    if not _profiling.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # another profiling tool (debugger, coverage) is active
+        _profiling.release()
+        return None
+    return profiler
+
+
+def _stop_profiler(profiler: cProfile.Profile):
+    profiler.disable()
+    _profiling.release()
+
+
+class ProfileSampler:
+    """
+    Opt-in cProfile sampling: a `rate` fraction of calls is profiled and the
+    stats of those slower than `threshold_ms` are written to `out_dir` as
+    .prof files (open with `python -m pstats` or snakeviz). Disabled when
+    `threshold_ms` is None.
+    """
+
+    def __init__(self, threshold_ms: Optional[float] = None, rate: float = 0.1,
+                 out_dir: Optional[str] = None):
+        self.threshold_ms = threshold_ms
+        self.rate = rate
+        self.out_dir = out_dir
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_ms is not None
+
+    def sample(self, label: str) -> Optional[Dict[str, Any]]:
+        """A profile request for collect()/profiled(), or None if this call is not sampled."""
+        if not self.enabled or random.random() >= self.rate:
+            return None
+        return {"threshold_ms": self.threshold_ms, "out_dir": self.out_dir, "label": label}
+
+    @contextmanager
+    def profiled(self, label: str):
+        """
+        Profiles the block in the current thread when sampled. On the event
+        loop thread this also captures whatever other requests run meanwhile.
+        """
+        profile = self.sample(label)
+        profiler = _start_profiler() if profile is not None else None
+        if profiler is None:
+            yield
+            return
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            _stop_profiler(profiler)
+            dump_profile(profiler, profile, time.perf_counter() - t0, "request")
+
+
+def dump_profile(profiler: cProfile.Profile, profile: Dict[str, Any], seconds: float, name: str):
+    if seconds * 1000 < profile["threshold_ms"]:
+        return
+    out_dir = profile["out_dir"]
+    label = "".join(c if c.isalnum() else "_" for c in profile["label"]).strip("_")
+    path = os.path.join(out_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{label}-{name}"
+                                 f"-{int(seconds * 1000)}ms.prof")
+    try:
+        os.makedirs(out_dir, exist_ok=True)
+        profiler.dump_stats(path)
+    except OSError as e:
+        logger.warning("Profile dump failed: %s", e)
+
+
+# --- PROMETHEUS METRICS ---
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _num(value) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], le: Optional[str] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, doc: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Tuple[str, ...] = (), value: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.doc}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                yield f"{self.name}{_labels(self.labelnames, labels)} {_num(value)}"
+
+
+class Histogram:
+    def __init__(self, name: str, doc: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], list] = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.doc}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    yield f"{self.name}_bucket{_labels(self.labelnames, labels, _num(bound))} {count}"
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, '+Inf')} {series[-1]}"
+                yield f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-2]:.6f}"
+                yield f"{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}"
+
+
+class Registry:
+    """
+    Collects request metrics and renders them in the Prometheus text format.
+    `gauges` are callables returning {name: value} read at scrape time
+    (cache and worker-pool stats).
+    """
+
+    def __init__(self):
+        self.requests = Counter("chartyap_requests_total", "Requests by route, method and status.",
+                                ("route", "method", "status"))
+        self.latency = Histogram("chartyap_request_duration_seconds", "Request latency.",
+                                 ("route", "method"))
+        self.stages = Histogram("chartyap_stage_duration_seconds", "Time spent per processing stage.",
+                                ("route", "stage"))
+        self.processed = Counter("chartyap_processed_total",
+                                 "Work processed: rows, columns, bytes_in, bytes_out, images, errors.",
+                                 ("route", "unit"))
+        self.payload = Histogram("chartyap_response_bytes", "Response body size.", ("route",),
+                                 buckets=SIZE_BUCKETS)
+        self.gauges: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def observe_request(self, route: str, method: str, status: int, seconds: float,
+                        metrics: RequestMetrics, bytes_out: Optional[int] = None):
+        self.requests.inc((route, method, str(status)))
+        self.latency.observe((route, method), seconds)
+        for name, value in metrics.stages.items():
+            self.stages.observe((route, name), value)
+        for name, value in metrics.counts.items():
+            self.processed.inc((route, name), value)
+        if bytes_out is not None:
+            self.processed.inc((route, "bytes_out"), bytes_out)
+            self.payload.observe((route,), bytes_out)
+
+    def render(self) -> str:
+        lines = []
+        for metric in (self.requests, self.latency, self.stages, self.processed, self.payload):
+            lines.extend(metric.render())
+        for prefix, read in self.gauges.items():
+            for key, value in read().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    name = f"chartyap_{prefix}_{key}"
+                    lines.append(f"# TYPE {name} gauge")
+                    lines.append(f"{name} {_num(value)}")
+        return "\n".join(lines) + "\n"
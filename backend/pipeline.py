@@ -0,0 +1,124 @@
+import io
+import pandas as pd
+from typing import Dict, Any, Optional, Union
+from analyzer import analyze_dataframe, analyze_profile, DEFAULT_RECOMMENDATIONS
+from ingestion import stream_csv, DEFAULT_CHUNKSIZE, PREVIEW_ROWS
+from aggregation import aggregate_recommendations, recommendation_fields
+from serialization import preview_frame
+from inference import infer_types
+from formats import (source_format, read_frame, ColumnarSource, profile_columnar,
+                     CSV_FORMATS, COLUMNAR_FORMATS)
+from ranking import sample_size, sample_frame, RANK_SAMPLE_ROWS
+from metrics import stage, add_count
+
+
+def detect_format(source, filename: Optional[str] = None) -> str:
+    """Sniffed format of an upload (bytes, path or file object); ValueError if unsupported."""
+    fmt = source_format(source, filename)
+    if fmt is None:
+        raise ValueError("Unsupported file format")
+    return fmt
+
+
+def load_dataframe(source, filename: str) -> pd.DataFrame:
+    """
+    Parses a whole upload (bytes, path or file object) into a typed
+    DataFrame. The format is sniffed from the content; `filename` only
+    decides whether plain text is accepted as CSV.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    fmt = detect_format(source, filename)
+
+    with stage("parse"):
+        df = read_frame(source, fmt)
+    # Parquet / Feather / Arrow carry their own types
+    if fmt in COLUMNAR_FORMATS:
+        return df
+    # Dates, numeric text, categories and narrower ints (see inference.py)
+    with stage("infer_types"):
+        return infer_types(df)
+
+
+def analyze_columnar(source, fmt: str, max_recommendations: int = DEFAULT_RECOMMENDATIONS,
+                     aggregate: bool = False, limit: int = PREVIEW_ROWS) -> Dict[str, Any]:
+    """
+    run_analysis for Parquet / Feather / Arrow input without loading the
+    table: shape and types come from the file metadata, the profile is
+    built one column at a time, aggregation reads only the columns the
+    recommendations use, and ranking and the preview read only the leading
+    rows.
+    """
+    src = ColumnarSource(source, fmt)
+    shape = (src.num_rows, len(src.columns))
+    add_count("rows", shape[0])
+    add_count("columns", shape[1])
+
+    with stage("profile"):
+        columns = profile_columnar(src)
+    # Leading rows serve as both the ranking sample and the preview
+    with stage("load"):
+        head = src.head(max(limit, sample_size(shape[1])))
+    with stage("recommend"):
+        result = analyze_profile(columns, shape, max_recommendations=max_recommendations, sample=head)
+
+    if aggregate:
+        fields = [f for f in recommendation_fields(result["recommendations"]) if f in columns]
+        with stage("load"):
+            df = src.read(fields)
+        with stage("aggregate"):
+            aggregate_recommendations(df, result)
+        del df
+
+    result["preview"] = preview_frame(head, limit)
+    return result
+
+
+def run_analysis(source: Union[bytes, str], filename: str, stream: bool = False,
+                 chunksize: int = DEFAULT_CHUNKSIZE, approx_distinct: bool = False,
+                 max_recommendations: int = DEFAULT_RECOMMENDATIONS,
+                 aggregate: bool = False, limit: int = PREVIEW_ROWS) -> Dict[str, Any]:
+    """
+    Parses and analyzes one upload. `source` is the raw bytes or a path to
+    them on disk. CSV goes through stream_csv with `stream`, columnar files
+    through analyze_columnar; everything else is parsed whole. The result
+    keeps the preview as a DataFrame, encoded later in the negotiated format.
+    """
+    fmt = detect_format(source, filename)
+    if fmt in COLUMNAR_FORMATS:
+        return analyze_columnar(source, fmt, max_recommendations=max_recommendations,
+                                aggregate=aggregate, limit=limit)
+
+    # Streaming mode: profile the CSV chunk by chunk, keeping only the
+    # leading rows in memory. The full frame is never materialized, so
+    # `aggregate` does not apply here.
+    if stream and fmt in CSV_FORMATS:
+        with stage("stream_profile"):
+            # leading rows are kept for the preview and as the ranking sample
+            profile, head = stream_csv(source, chunksize=chunksize, preview_rows=max(limit, RANK_SAMPLE_ROWS),
+                                       approx_distinct=approx_distinct, compression=CSV_FORMATS[fmt])
+        add_count("rows", profile.shape[0])
+        add_count("columns", profile.shape[1])
+        with stage("recommend"):
+            result = analyze_profile(profile.columns(), profile.shape, max_recommendations=max_recommendations,
+                                     sample=sample_frame(head))
+        result["preview"] = preview_frame(head, limit)
+        return result
+
+    df = load_dataframe(source, filename)
+    add_count("rows", df.shape[0])
+    add_count("columns", df.shape[1])
+
+    # Run analysis
+    result = analyze_dataframe(df, approx_distinct=approx_distinct,
+                               max_recommendations=max_recommendations)
+
+    # Bins, group-bys and densities computed over every row, not just the preview
+    if aggregate:
+        with stage("aggregate"):
+            aggregate_recommendations(df, result)
+
+    # Return data for frontend visualization (Limit to 5000 rows to prevent payload issues)
+    # Only the preview rows are kept; NaN handling happens when they are encoded
+    result["preview"] = preview_frame(df, limit)
+    return result
@@ -0,0 +1,313 @@
+import math
+import pandas as pd
+import numpy as np
+from typing import Dict, Any, List, Optional
+
+# Precision of the approximate distinct counter: 2**14 registers (16 KB),
+# standard error ~0.8%.
+HLL_PRECISION = 14
+# Frames shorter than this are always counted exactly when approx_distinct is on.
+APPROX_MIN_ROWS = 100_000
+# Numeric columns are profiled in float64 blocks of at most this many bytes,
+# so the working copy stays bounded however wide (or narrow-typed) the frame is
+NUMERIC_BLOCK_BYTES = 32 << 20
+# Chunk hashes are buffered and folded into the sorted exact set once the
+# buffer is as large as the set (or this many), so merging stays amortized
+# O(n log n) instead of re-sorting the whole set for every chunk.
+PENDING_MIN = 1 << 16
+
+
+def classify_dtype(dtype) -> str:
+    """
+    Maps a pandas dtype to the column type used by the chart registry.
+    """
+    if pd.api.types.is_numeric_dtype(dtype):
+        return "numeric"
+    elif pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime"
+    return "categorical"
+
+
+def hash_values(series: pd.Series) -> np.ndarray:
+    """
+    64-bit hashes of the non-null values of a series.
+    Numeric values are hashed as float64 so that an int chunk and a
+    NaN-bearing float chunk of the same column agree.
+    """
+    values = series.dropna()
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        values = values.astype("float64")
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+
+class HyperLogLog:
+    """
+    Minimal HyperLogLog distinct counter over pre-hashed uint64 values.
+    Registers are a numpy array, so updates are vectorized and two sketches
+    merge with an element-wise max.
+    """
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def add(self, hashes: np.ndarray):
+        if len(hashes) == 0:
+            return
+        hashes = hashes.astype(np.uint64, copy=False)
+        q = 64 - self.p
+        idx = (hashes >> np.uint64(q)).astype(np.intp)
+        rest = hashes & np.uint64((1 << q) - 1)
+        # bit length via the float exponent; rest == 0 gives 0
+        _, bit_length = np.frexp(rest.astype(np.float64))
+        rank = (q - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rank)
+
+    def merge(self, other: "HyperLogLog"):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # small range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+def _scalar(value):
+    """Converts numpy / pandas scalars to JSON-safe Python values."""
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+class ColumnProfile:
+    """
+    Mergeable profile of one column: type, row/null counts, min/max and a
+    distinct-value state (exact sorted hash set, or a HyperLogLog sketch).
+    With `max_exact`, the exact set switches to a sketch once it holds more
+    than that many values.
+    """
+
+    def __init__(self, col_type: Optional[str] = None, approx: bool = False,
+                 max_exact: Optional[int] = None):
+        self.type = col_type
+        self.count = 0
+        self.null_count = 0
+        self.min = None
+        self.max = None
+        self.approx = approx
+        self.max_exact = max_exact
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.sketch = HyperLogLog() if approx else None
+        self._pending: List[np.ndarray] = []  # unique hashes of chunks not yet in `hashes`
+        self._pending_size = 0
+
+    def __getstate__(self):
+        self._flush()
+        return self.__dict__
+
+    def __setstate__(self, state):
+        # states pickled before the pending buffer existed
+        state.setdefault("max_exact", None)
+        state.setdefault("_pending", [])
+        state.setdefault("_pending_size", 0)
+        self.__dict__.update(state)
+
+    def update(self, series: pd.Series):
+        col_type = classify_dtype(series.dtype)
+        nulls = int(series.isna().sum())
+        self.count += len(series)
+        self.null_count += nulls
+        if nulls == len(series):
+            # an all-null chunk says nothing about the column type
+            self.type = self.type or col_type
+            return
+        self._merge_type(col_type)
+        if col_type == "numeric":
+            self._merge_range(float(series.min()), float(series.max()))
+        elif col_type == "datetime":
+            self._merge_range(series.min(), series.max())
+        self._add_hashes(hash_values(series))
+
+    def merge(self, other: "ColumnProfile"):
+        self.count += other.count
+        self.null_count += other.null_count
+        if other.type is not None:
+            self._merge_type(other.type)
+        self._merge_range(other.min, other.max)
+        if other.sketch is not None:
+            self._to_sketch()
+            self.sketch.merge(other.sketch)
+        else:
+            other._flush()
+            self._add_hashes(other.hashes)
+
+    def _merge_type(self, col_type: str):
+        # A column that is numeric in one part and text in another ends up as
+        # object dtype when read whole, so the weaker type wins.
+        if self.type is None or self.type == col_type:
+            self.type = col_type
+        else:
+            self.type = "categorical"
+            self.min = self.max = None
+
+    def _merge_range(self, lo, hi):
+        if self.type == "categorical":
+            return
+        lo, hi = _scalar(lo), _scalar(hi)
+        try:
+            if lo is not None:
+                self.min = lo if self.min is None else min(self.min, lo)
+            if hi is not None:
+                self.max = hi if self.max is None else max(self.max, hi)
+        except TypeError:
+            self.min = self.max = None
+
+    def _add_hashes(self, hashes: np.ndarray):
+        if self.sketch is not None:
+            self.sketch.add(hashes)
+            return
+        hashes = np.unique(hashes)
+        if not len(hashes):
+            return
+        self._pending.append(hashes)
+        self._pending_size += len(hashes)
+        over_limit = self.max_exact is not None and len(self.hashes) + self._pending_size > self.max_exact
+        if over_limit or self._pending_size >= max(len(self.hashes), PENDING_MIN):
+            self._flush()
+            if self.max_exact is not None:
+                self.limit_exact(self.max_exact)
+
+    def _flush(self):
+        """Folds the buffered chunk hashes into the sorted exact set."""
+        if self._pending:
+            merged = np.concatenate([self.hashes] + self._pending)
+            self.hashes = np.unique(merged).astype(np.uint64, copy=False)
+            self._pending = []
+            self._pending_size = 0
+
+    def limit_exact(self, max_distinct: int):
+        """Switches to a HyperLogLog sketch once the exact hash set outgrows `max_distinct` values."""
+        self._flush()
+        if self.sketch is None and len(self.hashes) > max_distinct:
+            self._to_sketch()
+
+    def _to_sketch(self):
+        if self.sketch is None:
+            self._flush()
+            self.sketch = HyperLogLog()
+            self.sketch.add(self.hashes)
+            self.hashes = np.empty(0, dtype=np.uint64)
+            self.approx = True
+
+    @property
+    def distinct(self) -> int:
+        if self.sketch is not None:
+            return self.sketch.count()
+        self._flush()
+        return int(len(self.hashes))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "type": self.type or "categorical",
+            "unique_values": self.distinct,
+            "null_count": self.null_count,
+            "min": _scalar(self.min),
+            "max": _scalar(self.max),
+            "approximate": self.approx,
+        }
+
+
+def _numeric_stats(df: pd.DataFrame, cols):
+    """
+    _numeric_block_stats over batches of columns, each batch one float64
+    block of at most NUMERIC_BLOCK_BYTES (a single column per batch when one
+    column alone is larger).
+    """
+    per_batch = max(1, NUMERIC_BLOCK_BYTES // max(8 * len(df), 1))
+    stats = {}
+    for i in range(0, len(cols), per_batch):
+        stats.update(_numeric_block_stats(df, cols[i:i + per_batch]))
+    return stats
+
+
+def _numeric_block_stats(df: pd.DataFrame, cols):
+    """
+    Null count, min, max and exact distinct count for numeric columns at
+    once, on a single float64 block sorted column-wise.
+    """
+    block = df[cols].to_numpy(dtype=np.float64, na_value=np.nan)
+    if not block.flags.writeable:
+        # a single float64 block comes back as a read-only view
+        block = block.copy()
+    block.sort(axis=0)  # NaNs sort to the end of every column
+    valid = ~np.isnan(block)
+    n_valid = valid.sum(axis=0)
+    if len(block):
+        changes = (block[1:] != block[:-1]) & valid[1:]
+        distinct = changes.sum(axis=0) + valid[0]
+    else:
+        distinct = np.zeros(len(cols), dtype=np.int64)
+    last = np.maximum(n_valid - 1, 0)
+    mins = block[0] if len(block) else np.full(len(cols), np.nan)
+    maxs = block[last, np.arange(len(cols))] if len(block) else np.full(len(cols), np.nan)
+    stats = {}
+    for i, col in enumerate(cols):
+        has_values = n_valid[i] > 0
+        stats[col] = {
+            "type": "numeric",
+            "unique_values": int(distinct[i]),
+            "null_count": int(len(block) - n_valid[i]),
+            "min": _scalar(mins[i]) if has_values else None,
+            "max": _scalar(maxs[i]) if has_values else None,
+            "approximate": False,
+        }
+    return stats
+
+
+def profile_dataframe(df: pd.DataFrame, approx_distinct: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    Profiles every column of `df` in one batched pass.
+
+    Returns {column: {"type", "unique_values", "null_count", "min", "max",
+    "approximate"}} in column order. Numeric columns are sorted together in
+    bounded float64 blocks; other columns are hashed once each. With
+    `approx_distinct`, non-numeric columns of large frames are counted with
+    a HyperLogLog sketch instead of an exact hash set.
+    """
+    types = {col: classify_dtype(dtype) for col, dtype in df.dtypes.items()}
+    numeric_cols = [c for c, t in types.items() if t == "numeric"]
+    stats = _numeric_stats(df, numeric_cols) if numeric_cols else {}
+
+    use_sketch = approx_distinct and len(df) >= APPROX_MIN_ROWS
+    for col, col_type in types.items():
+        if col in stats:
+            continue
+        series = df[col]
+        nulls = int(series.isna().sum())
+        if use_sketch:
+            sketch = HyperLogLog()
+            sketch.add(hash_values(series))
+            distinct = sketch.count()
+        else:
+            distinct = int(series.nunique())
+        has_range = col_type == "datetime" and nulls < len(series)
+        stats[col] = {
+            "type": col_type,
+            "unique_values": distinct,
+            "null_count": nulls,
+            "min": series.min() if has_range else None,
+            "max": series.max() if has_range else None,
+            "approximate": use_sketch,
+        }
+
+    return {col: stats[col] for col in df.columns}
@@ -0,0 +1,246 @@
+import heapq
+import itertools
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Scores are computed on at most this many rows, fewer for wide tables so
+# the sample stays under RANK_SAMPLE_CELLS values.
+RANK_SAMPLE_ROWS = 10_000
+RANK_SAMPLE_CELLS = 1_000_000
+MIN_SAMPLE_ROWS = 500
+
+# Only the best columns of each type are bound into candidates, so pair
+# templates stay O(MAX_RANKED_COLUMNS^2) on very wide tables.
+MAX_RANKED_COLUMNS = 30
+
+# Bars and pies read best with a handful of categories
+GOOD_CATEGORIES = (2, 12)
+# Later templates of the same binding (density after histogram, ...) score lower
+TEMPLATE_DECAY = 0.75
+# The "first column" bindings only add mark variations of other charts
+FALLBACK_WEIGHT = 0.5
+# Trends over time are usually the headline chart of a dataset
+TIME_SERIES_SCORE = 0.9
+# Each chart already picked from the same template / binding / on the same
+# column multiplies a candidate's score by these, so one kind of chart (or
+# one column) cannot fill the list
+REPEAT_TEMPLATE = 0.5
+REPEAT_BINDING = 0.8
+REPEAT_COLUMN = 0.8
+
+
+def sample_size(width: int) -> int:
+    """Rows to rank a `width`-column table on."""
+    return min(RANK_SAMPLE_ROWS, max(MIN_SAMPLE_ROWS, RANK_SAMPLE_CELLS // max(width, 1)))
+
+
+def sample_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Evenly spaced rows of `df`, fewer for wide frames (deterministic, so results stay cacheable)."""
+    n = sample_size(df.shape[1])
+    if len(df) <= n:
+        return df
+    return df.iloc[np.linspace(0, len(df) - 1, n).astype(np.int64)]
+
+
+# --- DATASET STATISTICS ---
+
+class RankStats:
+    """
+    Vectorized statistics computed once per dataset from a row sample:
+    |skewness| per numeric column, the |correlation| matrix of the numeric
+    columns, normalized entropy per categorical column, and the correlation
+    ratio (eta squared) of each numeric column within each categorical one.
+    Everything falls back to neutral values when no sample is given, so
+    profile-only callers still rank by cardinality.
+    """
+
+    def __init__(self, columns: Dict[str, Dict[str, Any]], sample: Optional[pd.DataFrame] = None):
+        self.columns = columns
+        self.numeric = [c for c, info in columns.items() if info["type"] == "numeric"]
+        self.categorical = [c for c, info in columns.items() if info["type"] == "categorical"]
+        self.skew: Dict[Any, float] = {}
+        self.entropy: Dict[Any, float] = {}
+        self.eta: Dict[Tuple[Any, Any], float] = {}
+        self._corr: Optional[np.ndarray] = None
+        self._pos: Dict[Any, int] = {}
+        if sample is not None and len(sample) < 2:
+            sample = None
+
+        values = None
+        if sample is not None:
+            numeric = [c for c in self.numeric if c in sample.columns]
+            if numeric:
+                values = sample[numeric].apply(pd.to_numeric, errors="coerce").astype(np.float64)
+                values = values.where(np.isfinite(values))  # +-inf would poison every moment
+                self.skew = values.skew().abs().fillna(0.0).to_dict()
+                self._corr = self._abs_corr(values)
+                self._pos = {c: i for i, c in enumerate(numeric)}
+            for col in self.categorical:
+                if col in sample.columns:
+                    shares = sample[col].value_counts(normalize=True).to_numpy()
+                    shares = shares[shares > 0]
+                    if len(shares) > 1:
+                        self.entropy[col] = float(-(shares * np.log(shares)).sum() / np.log(len(shares)))
+
+        self.ranked = self._rank_columns()
+        if values is not None:
+            self._correlation_ratios(sample, values)
+
+    def _rank_columns(self) -> Dict[str, Dict[str, Any]]:
+        """
+        The profile reordered best column first within each type and cut to
+        MAX_RANKED_COLUMNS per type, so single-column bindings ("first
+        numeric") pick the most informative column. Numeric columns rank by
+        their skew or their strongest correlation, whichever is higher.
+        """
+        strongest = {}
+        if self._corr is not None and len(self._pos) > 1:
+            off_diagonal = self._corr - np.eye(len(self._pos))
+            strongest = dict(zip(self._pos, off_diagonal.max(axis=1)))
+        numeric = sorted(self.numeric, reverse=True,
+                         key=lambda c: max(self.distribution(c), strongest.get(c, 0.0)))
+        categorical = sorted(self.categorical, key=self.categories, reverse=True)
+        datetime = [c for c, info in self.columns.items() if info["type"] == "datetime"]
+        ordered = numeric[:MAX_RANKED_COLUMNS] + categorical[:MAX_RANKED_COLUMNS] + datetime
+        return {c: self.columns[c] for c in ordered}
+
+    def _correlation_ratios(self, sample: pd.DataFrame, values: pd.DataFrame):
+        """eta^2 = between-group / total sum of squares, per kept categorical column over all kept numerics at once."""
+        numeric = [c for c in self.ranked if c in self._pos]
+        if not numeric:
+            return
+        values = values[numeric]
+        grand = values.mean()
+        total = ((values - grand) ** 2).sum()
+        for col in self.ranked:
+            if col not in self.entropy:  # absent from the sample, or a single category
+                continue
+            groups = values.groupby(sample[col].to_numpy(), dropna=True)
+            between = (groups.count() * (groups.mean() - grand) ** 2).sum()
+            ratio = (between / total.where(total > 0)).fillna(0.0).clip(0.0, 1.0)
+            for num, eta in ratio.items():
+                self.eta[(num, col)] = float(eta)
+
+    @staticmethod
+    def _abs_corr(values: pd.DataFrame) -> np.ndarray:
+        """|Pearson r| matrix of the columns (NaNs mean-imputed), via one matrix product."""
+        x = (values - values.mean()).fillna(0.0).to_numpy()
+        norms = np.sqrt((x * x).sum(axis=0))
+        norms[norms == 0] = np.inf
+        z = x / norms
+        return np.abs(z.T @ z)
+
+    # --- per column / pair ---
+
+    def corr(self, a, b) -> float:
+        if self._corr is None or a not in self._pos or b not in self._pos:
+            return 0.5
+        return float(self._corr[self._pos[a], self._pos[b]])
+
+    def distribution(self, col) -> float:
+        """Skewed distributions are worth a histogram more than flat ones; constants are not."""
+        if self.columns[col]["unique_values"] <= 1:
+            return 0.0
+        # saturates smoothly, so strongly skewed columns still rank apart
+        skew = self.skew.get(col, 0.5)
+        return 0.3 + 0.7 * skew / (skew + 1.0)
+
+    def category_fit(self, col) -> float:
+        """1 for a handful of categories, decaying for more; 0 for a single one."""
+        k = self.columns[col]["unique_values"]
+        lo, hi = GOOD_CATEGORIES
+        if k < lo:
+            return 0.0
+        return 1.0 if k <= hi else hi / k
+
+    def categories(self, col) -> float:
+        """Category count fit for bars/pies, favouring uneven shares over flat ones."""
+        return self.category_fit(col) * (0.6 + 0.4 * (1.0 - self.entropy.get(col, 0.5)))
+
+    def grouped(self, num, cat) -> float:
+        """How much of a numeric column's variance the categories explain."""
+        return self.eta.get((num, cat), 0.25) * self.category_fit(cat)
+
+
+# --- CANDIDATE SCORES ---
+
+def binding_score(binding_name: str, b: Dict[str, Any], stats: RankStats) -> float:
+    """How informative a column assignment is for its family of charts, in [0, 1]."""
+    if binding_name == "each_numeric":
+        return stats.distribution(b["col"])
+    if binding_name == "first_numeric":
+        return FALLBACK_WEIGHT * stats.distribution(b["col"])
+    if binding_name == "each_categorical":
+        return stats.categories(b["col"])
+    if binding_name == "first_categorical":
+        return FALLBACK_WEIGHT * stats.categories(b["col"])
+    if binding_name == "numeric_pairs":
+        return stats.corr(b["x"], b["y"])
+    if binding_name == "numeric_by_categorical":
+        return stats.grouped(b["num"], b["cat"])
+    if binding_name == "time_series":
+        return TIME_SERIES_SCORE if stats.columns[b["num"]]["unique_values"] > 1 else 0.0
+    if binding_name == "three_numeric":
+        return float(np.mean([stats.corr(x, y) for x, y in itertools.combinations((b["x"], b["y"], b["z"]), 2)]))
+    if binding_name == "two_numeric_categorical":
+        return stats.corr(b["x"], b["y"]) * stats.category_fit(b["c"])
+    if binding_name == "time_categorical":
+        return TIME_SERIES_SCORE * stats.category_fit(b["c"])
+    return 0.5
+
+
+def top_k(candidates: Iterable[Tuple[float, Tuple[Any, Dict[str, Any]]]], k: int) -> List[Tuple[float, Any]]:
+    """
+    `k` (score, (template, binding)) candidates picked greedily by score,
+    best first, where every pick discounts the remaining candidates of the
+    same template by REPEAT_TEMPLATE, of the same binding by REPEAT_BINDING
+    and on one of its columns by REPEAT_COLUMN; the returned scores include
+    that discount. Ties go to the earlier candidate (registry order).
+
+    Only each template's k best candidates can ever be picked, so those are
+    kept in size-k min-heaps while the candidates stream in. Discounts only
+    lower scores, so the greedy pass re-scores a popped candidate lazily
+    when picks since it was pushed have made its score stale.
+    """
+    if k <= 0:
+        return []
+    buckets: Dict[Any, List[Tuple[float, int, Any]]] = {}
+    for seq, (score, item) in enumerate(candidates):
+        bucket = buckets.setdefault(item[0], [])
+        entry = (score, -seq, item)
+        if len(bucket) < k:
+            heapq.heappush(bucket, entry)
+        elif entry[:2] > bucket[0][:2]:
+            heapq.heapreplace(bucket, entry)
+
+    picked_templates: Dict[Any, int] = {}
+    picked_bindings: Dict[str, int] = {}
+    picked_columns: Dict[Any, int] = {}
+
+    def penalty(item) -> Tuple[int, int, int]:
+        template, binding = item
+        return (picked_templates.get(template, 0), picked_bindings.get(template.binding, 0),
+                max((picked_columns.get(c, 0) for c in binding.values() if c is not None), default=0))
+
+    # (-discounted score, seq, penalty it was computed with, raw score, item)
+    heap = [(-score, -neg_seq, (0, 0, 0), score, item)
+            for bucket in buckets.values() for score, neg_seq, item in bucket]
+    heapq.heapify(heap)
+    picked: List[Tuple[float, Any]] = []
+    while heap and len(picked) < k:
+        neg, seq, seen, score, item = heapq.heappop(heap)
+        current = penalty(item)
+        if current != seen:
+            templates, bindings, columns = current
+            discounted = (score * REPEAT_TEMPLATE ** templates * REPEAT_BINDING ** bindings
+                          * REPEAT_COLUMN ** columns)
+            heapq.heappush(heap, (-discounted, seq, current, score, item))
+            continue
+        picked.append((-neg, item))
+        template, binding = item
+        picked_templates[template] = current[0] + 1
+        picked_bindings[template.binding] = current[1] + 1
+        for col in set(binding.values()) - {None}:
+            picked_columns[col] = picked_columns.get(col, 0) + 1
+    return picked
@@ -0,0 +1,128 @@
+import datetime
+import orjson
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+from typing import Dict, Any, Optional
+from fastapi.responses import JSONResponse, Response
+
+FORMATS = ("records", "columnar", "arrow")
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+COLUMNAR_MEDIA_TYPE = "application/vnd.chartyap.columnar+json"
+
+
+def _default(obj):
+    """Fallback for values neither encoder handles natively."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if obj is pd.NaT:  # NaT is also a datetime instance
+        return None
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    return str(obj)
+
+
+def dumps(content: Any) -> bytes:
+    """JSON bytes via orjson, with numpy arrays and non-string keys allowed."""
+    return orjson.dumps(content, default=_default,
+                        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response encoded with dumps(). Returning this from an endpoint also
+    skips FastAPI's jsonable_encoder walk, which is a large share of the
+    cost for big previews.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def negotiate_format(requested: Optional[str], accept: Optional[str]) -> str:
+    """
+    Picks the preview format: an explicit ?format= wins, then the Accept
+    header, then the default records layout.
+    """
+    if requested in FORMATS:
+        return requested
+    accept = accept or ""
+    if ARROW_MEDIA_TYPE in accept:
+        return "arrow"
+    if COLUMNAR_MEDIA_TYPE in accept:
+        return "columnar"
+    return "records"
+
+
+def preview_frame(df: pd.DataFrame, limit: int) -> pd.DataFrame:
+    """The first `limit` rows; sliced before any copy so large frames are never duplicated."""
+    return df.head(limit) if len(df) > limit else df
+
+
+def _fill_nulls(preview: pd.DataFrame) -> pd.DataFrame:
+    # Simple fill na for visualization safety (only on the preview rows).
+    # Only numbers are filled with 0; missing dates and labels are sent as
+    # null, since a 0 date would be drawn at 1970-01-01.
+    numeric = {c: 0 for c in preview.columns if pd.api.types.is_numeric_dtype(preview[c].dtype)}
+    others = [c for c in preview.columns if c not in numeric and preview[c].hasnans]
+    if numeric:
+        preview = preview.fillna(numeric)
+    if others:
+        preview = preview.copy(deep=False)
+        for c in others:
+            preview[c] = preview[c].astype(object).where(preview[c].notna(), None)
+    return preview
+
+
+def to_records(preview: pd.DataFrame):
+    return _fill_nulls(preview).to_dict(orient="records")
+
+
+def to_columnar(preview: pd.DataFrame) -> Dict[str, Any]:
+    """
+    {"columns": [...], "data": {column: [values]}}: one list per column
+    instead of one dict per row.
+    """
+    filled = _fill_nulls(preview)
+    return {
+        "columns": list(filled.columns),
+        "data": {col: filled[col].tolist() for col in filled.columns},
+    }
+
+
+def to_arrow(result: Dict[str, Any], preview: pd.DataFrame) -> bytes:
+    """
+    Arrow IPC stream of the preview (nulls kept as Arrow nulls). The rest of
+    the analysis travels as JSON in the schema metadata under b"chartyap".
+    """
+    try:
+        table = pa.Table.from_pandas(preview, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # mixed-type object columns: ship them as text
+        mixed = preview.astype({c: str for c in preview.columns if preview[c].dtype == object})
+        table = pa.Table.from_pandas(mixed, preserve_index=False)
+    meta = {k: v for k, v in result.items() if k != "preview"}
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"chartyap": dumps(meta),
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def render_result(result: Dict[str, Any], fmt: str = "records") -> Response:
+    """
+    Builds the /analyze-data response. `result["preview"]` holds the preview
+    DataFrame (as cached); it is encoded here in the negotiated format.
+    """
+    preview = result["preview"]
+    if fmt == "arrow":
+        return Response(to_arrow(result, preview), media_type=ARROW_MEDIA_TYPE)
+
+    body = dict(result)
+    body["preview"] = to_columnar(preview) if fmt == "columnar" else to_records(preview)
+    return FastJSONResponse(body)
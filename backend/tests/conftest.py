@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# Backend modules are imported flat (`from profiler import ...`), as main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """main.py with a thread pool and throwaway storage, imported once per run."""
+    os.environ["CHARTYAP_POOL"] = "thread"
+    os.environ["CHARTYAP_DATA_DIR"] = str(tmp_path_factory.mktemp("datasets"))
+    os.environ["CHARTYAP_PROFILE_DIR"] = str(tmp_path_factory.mktemp("profiles"))
+    import main
+    return main
+
+
+@pytest.fixture
+def client(app_module):
+    from fastapi.testclient import TestClient
+    app_module.result_cache.clear()
+    app_module.image_cache.clear()
+    # Not entered as a context manager: the lifespan would shut the shared pool down
+    return TestClient(app_module.app)
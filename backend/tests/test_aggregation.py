@@ -0,0 +1,66 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from aggregation import Aggregator, nice_bins, kde_curve
+
+
+def _rec(encoding, transform=None):
+    return {"id": "r", "type": "bar", "encoding": encoding, "transform": transform}
+
+
+def test_nice_bins_use_round_steps():
+    assert nice_bins(0, 97) == (0, 10)
+    assert nice_bins(3, 17) == (2, 2)
+    assert nice_bins(5, 5) == (5, 1.0)
+
+
+def test_group_aggregate_matches_pandas():
+    df = pd.DataFrame({"cat": ["a", "b", "a", "c", "b", "a"], "v": [1.0, 2.0, 3.0, 4.0, np.nan, 5.0]})
+    rec = Aggregator(df).aggregate(_rec({"x": {"field": "cat", "type": "nominal"},
+                                         "y": {"field": "v", "aggregate": "sum"}}))
+    assert rec["encoding"]["y"] == {"field": "sum_v", "type": "quantitative"}
+    assert {row["cat"]: row["sum_v"] for row in rec["data"]} == df.groupby("cat")["v"].sum().to_dict()
+
+
+def test_histogram_bins_cover_finite_values_only():
+    values = np.concatenate([np.arange(100, dtype=float), [np.nan, np.inf, -np.inf]])
+    rec = Aggregator(pd.DataFrame({"v": values})).aggregate(
+        _rec({"x": {"field": "v", "bin": True}, "y": {"aggregate": "count"}}))
+    assert [row["v"] for row in rec["data"]] == list(range(0, 100, 10))
+    assert all(row["count"] == 10 for row in rec["data"])
+    assert all(row["v_end"] - row["v"] == 10 for row in rec["data"])
+    assert rec["encoding"]["x2"] == {"field": "v_end"}
+
+
+def test_raw_row_charts_are_not_aggregated(caplog):
+    df = pd.DataFrame({"x": [1.0, 2.0], "y": [3.0, 4.0]})
+    assert Aggregator(df).aggregate(_rec({"x": {"field": "x"}, "y": {"field": "y"}})) is None
+    # a missing column skips the spec rather than failing the request
+    with caplog.at_level("DEBUG", logger="aggregation"):
+        assert Aggregator(df).aggregate(_rec({"x": {"field": "nope"}, "y": {"aggregate": "count"}})) is None
+    assert "Aggregation skipped for r" in caplog.text
+
+
+def test_kde_integrates_to_one_and_peaks_at_the_mode():
+    values = np.random.default_rng(0).normal(5, 1, 50_000)
+    curve = kde_curve(values, values.min(), values.max())
+    step = curve["value"].iloc[1] - curve["value"].iloc[0]
+    assert math.isclose(curve["density"].sum() * step, 1.0, rel_tol=0.02)
+    assert abs(curve.loc[curve["density"].idxmax(), "value"] - 5) < 0.2
+    assert kde_curve(np.array([1.0]), 0, 1) is None
+    assert kde_curve(np.array([2.0, 2.0, 2.0]), 0, 4) is None
+
+
+def test_grouped_density_has_a_curve_per_group():
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({"v": np.concatenate([rng.normal(0, 1, 500), rng.normal(10, 1, 500), [np.inf]]),
+                       "g": ["a"] * 500 + ["b"] * 501})
+    rec = Aggregator(df).aggregate(_rec({"x": {"field": "value"}, "y": {"field": "density"}},
+                                        [{"density": "v", "groupby": ["g"], "as": ["value", "density"]}]))
+    data = pd.DataFrame(rec["data"])
+    assert rec["transform"] is None
+    assert set(data["g"]) == {"a", "b"}
+    peaks = data.loc[data.groupby("g")["density"].idxmax()].set_index("g")["value"]
+    assert abs(peaks["a"]) < 1 and abs(peaks["b"] - 10) < 1
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from analyzer import analyze_dataframe, analyze_profile
+from chart_registry import match_templates
+
+
+def _frame(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "price": rng.lognormal(3, 1, n),
+        "units": rng.integers(0, 50, n),
+        "weight": rng.normal(10, 2, n),
+        "region": rng.choice(["North", "South", "East"], n),
+        "date": pd.date_range("2024-01-01", periods=n, freq="D"),
+    })
+
+
+def _signature(rec):
+    enc = rec["encoding"]
+    return (str(rec["type"]),) + tuple(
+        enc.get(channel, {}).get(key) for channel, key in (("x", "field"), ("y", "field"), ("theta", "field"),
+                                                          ("x", "aggregate"), ("y", "aggregate")))
+
+
+def test_stops_at_the_requested_count_of_distinct_charts():
+    df = _frame()
+    for n in (1, 5, 12):
+        recs = analyze_dataframe(df, max_recommendations=n)["recommendations"]
+        assert len(recs) == n
+        assert len({_signature(rec) for rec in recs}) == n
+
+
+def test_returns_every_distinct_chart_when_fewer_than_requested():
+    df = _frame()
+    recs = analyze_dataframe(df, max_recommendations=100)["recommendations"]
+    assert 12 < len(recs) < 100
+    assert len({rec["id"] for rec in recs}) == len(recs)
+
+
+def test_candidates_are_generated_lazily():
+    # 500 numeric columns: ~125k pairs would be built if the generator were materialized
+    columns = {f"c{i}": {"type": "numeric", "unique_values": 100} for i in range(500)}
+    candidates = match_templates(columns, 1000)
+    template, binding = next(candidates)
+    assert binding == {"col": "c0"}
+
+
+def test_no_columns_means_no_recommendations():
+    assert analyze_profile({}, (0, 0))["recommendations"] == []
+    assert analyze_dataframe(_frame(), max_recommendations=0)["recommendations"] == []
@@ -0,0 +1,42 @@
+import json
+
+from benchmark import Suite, measure, compare, main_cli
+
+
+def test_measure_reports_median_and_peak_memory():
+    stats = measure(lambda: bytearray(4 << 20), repeat=3)
+    assert stats["runs"] == 3 and stats["min_seconds"] <= stats["seconds"]
+    assert stats["peak_mb"] >= 4
+    assert "peak_mb" not in measure(lambda: None, repeat=1, memory=False)
+
+
+def test_suite_records_failures_instead_of_stopping(capsys):
+    suite = Suite(repeat=1, memory=False)
+    suite.bench("ok", lambda: None, rows=10)
+    suite.bench("broken", lambda: 1 / 0, rows=10)
+    assert [e["name"] for e in suite.results] == ["ok", "broken"]
+    assert suite.results[1]["error"].startswith("ZeroDivisionError")
+
+
+def test_compare_flags_slowdowns(tmp_path, capsys):
+    baseline = tmp_path / "before.json"
+    baseline.write_text(json.dumps({"results": [
+        {"name": "a", "params": {"rows": 1}, "seconds": 1.0},
+        {"name": "b", "params": {"rows": 1}, "seconds": 1.0},
+    ]}))
+    compare([{"name": "a", "params": {"rows": 1}, "seconds": 1.5},
+             {"name": "b", "params": {"rows": 1}, "seconds": 0.5},
+             {"name": "c", "params": {"rows": 1}, "seconds": 9.0}], str(baseline))
+    out = capsys.readouterr().out
+    assert "1.50x  SLOWER" in out and "0.50x  faster" in out and "\nc " not in out
+
+
+def test_cli_writes_comparable_results(tmp_path, capsys):
+    out = tmp_path / "results.json"
+    main_cli(["--rows", "500", "--repeat", "1", "--no-memory", "--skip", "endpoints", "images",
+              "--out", str(out)])
+    report = json.loads(out.read_text())
+    names = {entry["name"] for entry in report["results"]}
+    assert {"ingest.stream_csv", "analyze_dataframe", "serialize"} <= names
+    assert not [entry for entry in report["results"] if "error" in entry]
+    assert report["environment"]["pandas"]
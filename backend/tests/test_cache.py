@@ -0,0 +1,60 @@
+import os
+import pickle
+import time
+
+from cache import ResultCache, hash_upload
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ResultCache(max_bytes=3000)
+    for key in "abc":
+        cache.put(key, "x" * 800)
+    assert cache.get("a") is not None  # "b" is now the least recently used
+    cache.put("d", "x" * 800)
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in "acd")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl(tmp_path):
+    cache = ResultCache(ttl=60, disk_dir=str(tmp_path))
+    cache.put("k", {"v": 1})
+    assert cache.get("k") == {"v": 1}
+    path = cache._disk_path("k")
+    os.utime(path, (time.time(), time.time() - 120))
+    cache.clear()
+    assert cache.get("k") is None
+    assert not os.path.exists(path)
+
+
+def test_disk_tier_evicts_least_recently_hit(tmp_path):
+    blob_size = len(pickle.dumps("x" * 1000, protocol=pickle.HIGHEST_PROTOCOL))
+    cache = ResultCache(max_bytes=0, disk_dir=str(tmp_path), disk_max_bytes=3 * blob_size)
+    now = time.time()
+    for age, key in [(30, "a"), (20, "b"), (10, "c")]:
+        cache.put(key, "x" * 1000)
+        os.utime(cache._disk_path(key), (now - age, now - age))
+    # "a" was written first but hit last, so "b" goes when "d" is added
+    assert cache.get("a") == "x" * 1000
+    cache.put("d", "x" * 1000)
+    assert not os.path.exists(cache._disk_path("b"))
+    assert all(os.path.exists(cache._disk_path(key)) for key in "acd")
+    # a hit does not extend the TTL
+    assert os.path.getmtime(cache._disk_path("a")) == now - 30
+
+
+def test_hash_upload_rewinds(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_bytes(b"a,b\n1,2\n")
+    with open(path, "rb") as f:
+        assert hash_upload(f) == hash_upload(contents=b"a,b\n1,2\n")
+        assert f.tell() == 0
+
+
+def test_chunksize_is_part_of_the_cache_key(client):
+    data = b"a,b\n" + b"".join(b"%d,%d\n" % (i, i % 7) for i in range(3000))
+    misses = client.get("/cache/stats").json()["misses"]
+    first = client.post("/analyze-data?stream=true&chunksize=1000", files={"file": ("d.csv", data)})
+    second = client.post("/analyze-data?stream=true&chunksize=2000", files={"file": ("d.csv", data)})
+    assert first.status_code == second.status_code == 200
+    assert client.get("/cache/stats").json()["misses"] == misses + 2
@@ -0,0 +1,40 @@
+from chart_registry import TEMPLATES, TEMPLATE_INDEX, ChartTemplate, match_templates
+
+
+def _profile(**types):
+    return {name: {"type": kind, "unique_values": 10} for name, kind in types.items()}
+
+
+def test_templates_need_their_column_types():
+    numeric_only = _profile(a="numeric", b="numeric")
+    for template, _ in match_templates(numeric_only, 100):
+        assert set(template.key) == {"numeric"}
+    with_time = _profile(a="numeric", t="datetime")
+    assert any("datetime" in template.key for template, _ in match_templates(with_time, 100))
+
+
+def test_count_charts_skip_unique_id_columns():
+    columns = _profile(code="categorical", region="categorical")
+    columns["code"]["unique_values"] = 100
+    count_charts = {t.id for t in TEMPLATES if t.when == "not_unique_id"}
+    bound = [(t.id, b["col"]) for t, b in match_templates(columns, 100) if t.id in count_charts]
+    assert bound and all(col == "region" for _, col in bound)
+
+
+def test_builder_fills_placeholders_into_fresh_specs():
+    template = ChartTemplate("each_numeric", ("numeric",), "hist_{col}", "Histogram: {col}", "d", "bar",
+                             {"x": {"field": "{col}", "bin": True}, "y": {"aggregate": "count"}})
+    first, second = template.build({"col": 2024}), template.build({"col": 2024})
+    assert first["id"] == "hist_2024" and first["title"] == "Histogram: 2024"
+    # a bare placeholder keeps the raw (non-string) column label
+    assert first["encoding"]["x"]["field"] == 2024
+    first["encoding"]["x"]["bin"] = False
+    assert second["encoding"]["x"]["bin"] is True
+    assert template.signature({"col": 2024}) == "bar_2024____count"
+
+
+def test_registry_is_indexed_by_sorted_requirements():
+    assert sum(len(templates) for templates in TEMPLATE_INDEX.values()) == len(TEMPLATES)
+    for key, templates in TEMPLATE_INDEX.items():
+        assert list(key) == sorted(key)
+        assert all(t.key == key for t in templates)
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+from datasets import ingest_dataset, append_dataset, read_dataset, part_paths, stratified_indices
+from pipeline import load_dataframe
+from profiler import profile_dataframe
+from serialization import dumps
+
+
+def _frame(n, seed=0):
+    rng = np.random.default_rng(seed)
+    price = np.round(rng.lognormal(3, 1, n), 2)
+    price[rng.random(n) < 0.05] = np.nan
+    return pd.DataFrame({
+        "units": rng.integers(0, 500, n),
+        "price": price,
+        "region": rng.choice(["North", "South", "East", "West"], n),
+        "date": np.datetime_as_string(np.datetime64("2023-01-01") + rng.integers(0, 365, n).astype("timedelta64[D]"), unit="D"),
+    })
+
+
+def _csv(df):
+    return df.to_csv(index=False).encode()
+
+
+def test_appended_profile_matches_full_profile(tmp_path):
+    full = _frame(3000)
+    day1, day2, day3 = full.iloc[:2000], full.iloc[2000:2600], full.iloc[2600:]
+
+    meta = ingest_dataset(_csv(day1), "day1.csv", str(tmp_path / "a"))
+    meta = append_dataset(str(tmp_path / "a"), meta, _csv(day2), "day2.csv", str(tmp_path / "b"))
+    meta = append_dataset(str(tmp_path / "b"), meta, _csv(day3), "day3.csv", str(tmp_path / "c"))
+
+    expected = profile_dataframe(load_dataframe(_csv(full), "full.csv"))
+    assert meta["shape"] == list(full.shape)
+    assert meta["appended_rows"] == len(day3)
+    # compared as encoded JSON, so Timestamp / float min-max compare by value
+    assert dumps(meta["columns"]) == dumps(expected)
+    assert len(read_dataset(part_paths(str(tmp_path / "c"), meta))) == len(full)
+
+
+def test_stratified_sample_is_proportional():
+    rng = np.random.default_rng(0)
+    keys = pd.Series(rng.choice(["a", "b", "c", None], 10_000, p=[0.6, 0.25, 0.1, 0.05]))
+    counts = keys.value_counts(dropna=False)
+
+    indices = stratified_indices(keys, 500, np.random.default_rng(1))
+
+    assert len(indices) == 500
+    assert len(np.unique(indices)) == 500
+    assert np.all(np.diff(indices) > 0)  # file order
+    sampled = keys.iloc[indices].value_counts(dropna=False)
+    for key, count in counts.items():
+        # largest-remainder rounding: within one row of the exact quota
+        assert abs(sampled.get(key, 0) - count * 500 / len(keys)) < 1
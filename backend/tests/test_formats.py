@@ -0,0 +1,77 @@
+import gzip
+import io
+import zipfile
+
+import pandas as pd
+
+from formats import sniff_format, source_format, read_frame, PARSE_ERRORS
+
+CSV = b"a,b\n1,x\n2,y\n3,z\n"
+
+
+def _zip(entries):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as archive:
+        for name, data in entries.items():
+            archive.writestr(name, data)
+    return buf.getvalue()
+
+
+def _xlsx():
+    buf = io.BytesIO()
+    pd.DataFrame({"a": [1, 2], "b": ["x", "y"]}).to_excel(buf, index=False)
+    return buf.getvalue()
+
+
+def test_sniff_by_content_not_name():
+    assert sniff_format(gzip.compress(CSV), "data.csv") == "csv.gz"
+    assert sniff_format(b"PAR1....", "data.csv") == "parquet"
+    assert sniff_format(CSV, "data.csv") == "csv"
+    assert sniff_format(CSV, "data.json") is None
+    assert sniff_format(b"a,b\x00\x01", "data.csv") is None
+
+
+def test_only_workbook_zips_are_xlsx():
+    assert source_format(_xlsx(), "book.xlsx") == "xlsx"
+    assert source_format(_zip({"data.csv": CSV}), "data.xlsx") is None
+    # A damaged workbook is still routed to the Excel reader, which rejects it
+    assert source_format(b"PK\x03\x04garbage", "book.xlsx") == "xlsx"
+
+
+def test_source_format_rewinds_file_objects():
+    fileobj = io.BytesIO(_xlsx())
+    assert source_format(fileobj, "book.xlsx") == "xlsx"
+    assert fileobj.tell() == 0
+
+
+def test_parse_errors_cover_broken_uploads():
+    for data, fmt in [(b"PK\x03\x04garbage", "xlsx"), (_zip({"data.csv": CSV}), "xlsx"),
+                      (gzip.compress(CSV)[:-8], "csv.gz"), (b"", "csv")]:
+        try:
+            read_frame(io.BytesIO(data), fmt)
+        except PARSE_ERRORS:
+            continue
+        raise AssertionError(f"{fmt} upload parsed: {data[:16]!r}")
+
+
+def test_unreadable_uploads_get_400(client):
+    for name, data in [("book.xlsx", b"PK\x03\x04garbage"), ("data.csv.gz", gzip.compress(CSV)[:-8]),
+                       ("data.csv", b"")]:
+        response = client.post("/analyze-data", files={"file": (name, data)})
+        assert response.status_code == 400, (name, response.text)
+        assert response.json()["error"].startswith("Could not read file")
+
+
+def test_unsupported_uploads_are_rejected(client):
+    for name, data in [("data.xlsx", _zip({"data.csv": CSV})), ("data.json", b'{"a": 1}')]:
+        response = client.post("/analyze-data", files={"file": (name, data)})
+        assert response.json() == {"error": "Unsupported file format"}
+
+
+def test_columnar_index_stays_a_column(tmp_path):
+    from formats import ColumnarSource, profile_columnar
+    path = str(tmp_path / "indexed.parquet")
+    pd.DataFrame({"v": [1.5, 2.5, 3.5]}, index=pd.Index(["a", "b", "c"], name="key")).to_parquet(path)
+    src = ColumnarSource(path, "parquet")
+    profiled = list(profile_columnar(src))
+    assert profiled == list(src.read().columns) == list(src.head(2).columns) == ["v", "key"]
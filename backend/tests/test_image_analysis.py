@@ -0,0 +1,46 @@
+import cv2
+import numpy as np
+import pytest
+
+from generate_sample_data import generate_chart_image
+from image_analysis import analyze_chart_image, decode_gray, circle_support, WORK_SIZE
+
+
+@pytest.mark.parametrize("kind, expected", [("bar", "bar"), ("pie", "arc"), ("line", "line")])
+def test_fast_path_agrees_with_full_resolution(kind, expected):
+    for seed in range(3):
+        image = generate_chart_image(kind, 1920, 1080, seed=seed, ext=".jpg")
+        fast = analyze_chart_image(image, WORK_SIZE)
+        assert fast["detected_type"] == analyze_chart_image(image, None)["detected_type"] == expected
+        assert max(fast["size"]) <= WORK_SIZE
+        assert set(fast["timings"]) >= {"decode", "contours"}
+
+
+def test_decode_gray_downscales_large_images():
+    image = generate_chart_image("bar", 3840, 2160, ext=".jpg")
+    gray, scale = decode_gray(image, WORK_SIZE)
+    assert gray.ndim == 2 and max(gray.shape) == WORK_SIZE
+    assert scale == pytest.approx(WORK_SIZE / 3840, rel=0.01)
+    full, full_scale = decode_gray(image, None)
+    assert full.shape == (2160, 3840) and full_scale == 1.0
+    assert decode_gray(b"not an image") == (None, 1.0)
+
+
+def test_circle_support_separates_outlines_from_polylines():
+    edges = np.zeros((400, 400), np.uint8)
+    cv2.circle(edges, (200, 200), 120, 255, 2)
+    assert circle_support(edges, (200, 200, 120)) > 0.9
+    kinked = np.zeros((400, 400), np.uint8)
+    cv2.polylines(kinked, [np.array([[40, 300], [150, 120], [250, 260], [360, 80]])], False, 255, 2)
+    assert circle_support(kinked, (200, 200, 120)) < 0.4
+
+
+def test_edge_detection_is_timed_on_its_own():
+    timings = analyze_chart_image(generate_chart_image("line", 1280, 720), WORK_SIZE)["timings"]
+    assert list(timings) == ["decode", "contours", "hough_circles", "canny", "hough_lines"]
+
+
+def test_undecodable_upload_falls_back_to_bar(client):
+    response = client.post("/analyze-image", files={"file": ("chart.png", b"not an image")})
+    assert response.status_code == 200
+    assert response.json()["detected_type"] == "bar" and response.json()["cached"] is False
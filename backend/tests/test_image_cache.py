@@ -0,0 +1,105 @@
+import json
+
+import cv2
+import numpy as np
+
+from generate_sample_data import generate_chart_image
+from image_cache import ChartImageCache, _HashIndex, _hamming, _POPCOUNT, image_hash
+
+
+def _bits(seed, n_bytes=32):
+    return np.random.default_rng(seed).integers(0, 256, n_bytes, dtype=np.uint8).tobytes()
+
+
+def _flip(digest, bits):
+    array = np.frombuffer(digest, dtype=np.uint8).copy()
+    for bit in bits:
+        array[bit // 8] ^= 1 << (bit % 8)
+    return array.tobytes()
+
+
+def test_hamming_matches_bytewise_popcount():
+    rows = np.random.default_rng(0).integers(0, 256, (50, 32), dtype=np.uint8)
+    query = rows[7]
+    assert np.array_equal(_hamming(rows, query), _POPCOUNT[rows ^ query].sum(axis=1))
+    assert _hamming(rows, query)[7] == 0
+
+
+def test_hash_index_stays_in_step_with_removals():
+    index = _HashIndex(32)
+    keys = [(None, _bits(i)) for i in range(100)]
+    for key in keys:
+        index.add(key)
+    for key in keys[::3]:
+        index.remove(key)
+    for key in keys:
+        near = index.nearest(_flip(key[1], [1, 9]), 2)
+        assert near == (None if key in keys[::3] else key)
+
+
+def test_near_duplicates_hit_and_are_stored_under_their_own_hash():
+    cache = ChartImageCache(max_distance=4)
+    digest = _bits(1)
+    cache.put(digest, {"detected_type": "arc"})
+    look_alike = _flip(digest, [0, 17, 200])
+    assert cache.get(look_alike) == {"detected_type": "arc"}
+    assert cache.get(look_alike) == {"detected_type": "arc"}
+    assert cache.get(_flip(digest, range(0, 80, 8))) is None
+    # modes are kept apart
+    assert cache.get(digest, mode=800) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["near_hits"], stats["misses"]) == (1, 1, 2)
+
+
+def test_reencoded_screenshot_is_a_near_hit():
+    image = generate_chart_image("pie", 1280, 720, seed=3)
+    decoded = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR)
+    smaller = cv2.imencode(".jpg", cv2.resize(decoded, (960, 540)), [cv2.IMWRITE_JPEG_QUALITY, 70])[1].tobytes()
+    cache = ChartImageCache()
+    first = cache.detect(image)
+    assert cache.detect(smaller) == first
+    stats = cache.stats()
+    assert stats["hits"] + stats["near_hits"] == 1 and stats["misses"] == 1
+
+
+def test_lru_eviction_removes_hashes_from_the_index():
+    cache = ChartImageCache(max_entries=3, max_distance=2)
+    digests = [_bits(i) for i in range(4)]
+    for i, digest in enumerate(digests[:3]):
+        cache.put(digest, {"detected_type": str(i)})
+    cache.get(digests[0])
+    cache.put(digests[3], {"detected_type": "3"})
+    assert cache.stats()["evictions"] == 1
+    assert cache.get(_flip(digests[1], [5])) is None
+    assert cache.get(_flip(digests[0], [5])) == {"detected_type": "0"}
+
+
+def test_entries_survive_a_restart_and_the_log_is_compacted(tmp_path):
+    path = str(tmp_path / "images.jsonl")
+    cache = ChartImageCache(max_entries=2, path=path)
+    for i in range(5):
+        cache.put(_bits(i), {"detected_type": str(i)}, mode=800)
+    with open(path, "a") as f:
+        f.write(json.dumps({"v": "0", "mode": 800, "hash": _bits(9).hex(), "result": {}}) + "\n")
+        f.write('{"v": "2", "mo')
+
+    reloaded = ChartImageCache(max_entries=2, path=path)
+    assert reloaded.get(_bits(4), 800) == {"detected_type": "4"}
+    assert reloaded.get(_bits(3), 800) == {"detected_type": "3"}
+    assert reloaded.get(_bits(9), 800) is None
+    with open(path) as f:
+        assert len(f.readlines()) == 2
+    assert [p.name for p in tmp_path.iterdir()] == ["images.jsonl"]
+
+
+def test_image_hash_rejects_non_images():
+    assert image_hash(b"not an image") is None
+    assert len(image_hash(generate_chart_image("bar", 320, 240))) == 32
+
+
+def test_endpoint_reports_cached_results(client):
+    image = generate_chart_image("line", 1280, 720, seed=5)
+    first = client.post("/analyze-image", files={"file": ("c.png", image)}).json()
+    second = client.post("/analyze-image", files={"file": ("c.png", image)}).json()
+    assert first["detected_type"] == second["detected_type"] == "line"
+    assert (first["cached"], second["cached"]) == (False, True)
@@ -0,0 +1,59 @@
+import gzip
+
+import pandas as pd
+
+from inference import infer_types
+from ingestion import stream_csv
+from pipeline import load_dataframe
+
+
+def _day_first_csv():
+    # d/m/Y dates ordered by day of month: the first chunk only sees days <= 12,
+    # where month-first parses too
+    days = sorted(pd.date_range("2024-01-01", "2024-12-31"), key=lambda d: (d.day, d.month))
+    dates = [d.strftime("%d/%m/%Y") for d in days for _ in range(10)]
+    return pd.DataFrame({"date": dates, "v": range(len(dates))}).to_csv(index=False).encode()
+
+
+def test_infer_types_converts_dates_numbers_and_labels():
+    df = infer_types(pd.DataFrame({
+        "when": ["2024-01-%02d" % (i % 28 + 1) for i in range(400)],
+        "amount": [f"{i}.5" for i in range(400)],
+        "region": ["North", "South"] * 200,
+        "count": list(range(400)),
+    }))
+    assert pd.api.types.is_datetime64_any_dtype(df["when"])
+    assert pd.api.types.is_float_dtype(df["amount"])
+    assert isinstance(df["region"].dtype, pd.CategoricalDtype)
+    assert df["count"].dtype.itemsize < 8
+
+
+def test_infer_types_keeps_text_a_format_does_not_fit():
+    values = ["2024-01-%02d" % (i % 28 + 1) for i in range(2000)]
+    values[1001] = "someday"
+    df = infer_types(pd.DataFrame({"when": values}))
+    assert not pd.api.types.is_datetime64_any_dtype(df["when"])
+    assert df["when"].isna().sum() == 0
+
+
+def test_stream_replans_ambiguous_dates():
+    data = _day_first_csv()
+    full = load_dataframe(data, "dates.csv")
+    profile, head = stream_csv(data, chunksize=1000)
+    column = profile.columns()["date"]
+    assert column["type"] == "datetime"
+    assert column["unique_values"] == full["date"].nunique() == 366
+    assert column["null_count"] == 0
+    assert column["max"] == pd.Timestamp("2024-12-31")
+    assert pd.api.types.is_datetime64_any_dtype(head["date"])
+
+
+def test_stream_keeps_text_a_format_does_not_fit():
+    values = ["2024-01-%02d" % (i % 28 + 1) for i in range(3000)]
+    values[2500] = "someday"
+    data = gzip.compress(pd.DataFrame({"when": values}).to_csv(index=False).encode())
+    profile, _ = stream_csv(data, chunksize=1000, compression="gzip")
+    column = profile.columns()["when"]
+    assert column["type"] == "categorical"
+    assert column["null_count"] == 0
+    assert column["unique_values"] == 29
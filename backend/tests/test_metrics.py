@@ -0,0 +1,102 @@
+import contextvars
+import glob
+import os
+import threading
+
+from metrics import (Registry, RequestMetrics, ProfileSampler, Histogram, collect, start_request,
+                     current, stage, add_count, _start_profiler, _stop_profiler)
+
+
+def _work(n):
+    with stage("parse"):
+        add_count("rows", n)
+    return sum(range(n))
+
+
+def test_collect_exports_worker_stages():
+    result, exported, seconds = collect(_work, (1000,))
+    assert result == sum(range(1000))
+    assert exported["counts"] == {"rows": 1000}
+    assert set(exported["stages"]) == {"parse"} and seconds >= exported["stages"]["parse"]
+
+    request = RequestMetrics()
+    request.merge(exported)
+    request.merge(exported)
+    assert request.counts["rows"] == 2000
+    assert request.server_timing(0.25).endswith("total;dur=250.0")
+
+
+def test_stages_outside_a_request_are_ignored():
+    assert current() is None
+    with stage("anything"):
+        add_count("rows")
+
+    def request():
+        metrics = start_request()
+        with stage("read"):
+            add_count("rows", 3)
+        return metrics
+
+    # a copied context, as each request runs in its own
+    metrics = contextvars.copy_context().run(request)
+    assert current() is None
+    assert metrics.counts == {"rows": 3} and "read" in metrics.stages
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("h", "doc", ("route",), buckets=(1, 5))
+    for value in (0.5, 2, 2, 10):
+        histogram.observe(("/x",), value)
+    lines = list(histogram.render())
+    assert 'h_bucket{route="/x",le="1"} 1' in lines
+    assert 'h_bucket{route="/x",le="5"} 3' in lines
+    assert 'h_bucket{route="/x",le="+Inf"} 4' in lines
+    assert 'h_count{route="/x"} 4' in lines
+
+
+def test_registry_renders_requests_and_gauges():
+    registry = Registry()
+    registry.gauges = {"cache": lambda: {"hits": 3, "hit_rate": 0.5, "kind": "lru", "full": True}}
+    metrics = RequestMetrics()
+    metrics.add_stage("parse", 0.02)
+    metrics.add_count("rows", 10)
+    registry.observe_request('/analyze-"data"', "POST", 200, 0.1, metrics, bytes_out=2048)
+    text = registry.render()
+    assert 'chartyap_requests_total{route="/analyze-\\"data\\"",method="POST",status="200"} 1' in text
+    assert 'chartyap_processed_total{route="/analyze-\\"data\\"",unit="rows"} 10' in text
+    assert "chartyap_cache_hits 3" in text and "chartyap_cache_hit_rate 0.5" in text
+    assert "chartyap_cache_kind" not in text and "chartyap_cache_full" not in text
+
+
+def test_one_profiler_at_a_time():
+    first = _start_profiler()
+    assert first is not None
+    seen = []
+    thread = threading.Thread(target=lambda: seen.append(_start_profiler()))
+    thread.start()
+    thread.join()
+    assert seen == [None]
+    _stop_profiler(first)
+    second = _start_profiler()
+    assert second is not None
+    _stop_profiler(second)
+
+
+def test_slow_sampled_calls_are_dumped(tmp_path):
+    sampler = ProfileSampler(threshold_ms=0, rate=1.0, out_dir=str(tmp_path))
+    collect(_work, (10,), profile=sampler.sample("POST /analyze-data"))
+    with sampler.profiled("GET /health"):
+        _work(10)
+    names = sorted(os.path.basename(p) for p in glob.glob(str(tmp_path / "*.prof")))
+    assert len(names) == 2
+    assert any("-GET__health-request-" in n for n in names)
+    assert any("-POST__analyze_data-worker-" in n for n in names)
+    assert ProfileSampler().sample("x") is None
+
+
+def test_metrics_endpoint_and_server_timing(client):
+    response = client.post("/analyze-data", files={"file": ("d.csv", b"a,b\n1,x\n2,y\n")})
+    assert "parse;dur=" in response.headers["server-timing"]
+    text = client.get("/metrics").text
+    assert 'chartyap_requests_total{route="/analyze-data",method="POST",status="200"}' in text
+    assert "chartyap_workers_max_workers" in text
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+from profiler import HyperLogLog, ColumnProfile, hash_values, profile_dataframe
+from ingestion import StreamingProfile
+
+
+def test_hyperloglog_merge_equals_sketch_of_union():
+    a, b = pd.Series(np.arange(0, 60_000)), pd.Series(np.arange(40_000, 100_000))
+    left, right, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    left.add(hash_values(a))
+    right.add(hash_values(b))
+    union.add(hash_values(pd.concat([a, b])))
+
+    left.merge(right)
+
+    assert np.array_equal(left.registers, union.registers)
+    assert abs(left.count() - 100_000) / 100_000 < 0.03
+
+
+def test_streamed_chunks_match_whole_frame_profile():
+    rng = np.random.default_rng(0)
+    n = 50_000
+    df = pd.DataFrame({
+        "id": np.arange(n),
+        "value": rng.normal(size=n),
+        "label": rng.choice(list("abcdef"), n),
+    })
+    df.loc[rng.random(n) < 0.1, "value"] = np.nan
+
+    stream = StreamingProfile(max_exact=None)
+    for start in range(0, n, 7_000):
+        stream.update(df.iloc[start:start + 7_000])
+
+    assert stream.columns() == profile_dataframe(df)
+
+
+def test_exact_set_switches_to_sketch_past_cap():
+    profile = ColumnProfile(max_exact=1_000)
+    for start in range(0, 20_000, 500):
+        profile.update(pd.Series(np.arange(start, start + 500)))
+
+    assert profile.approx
+    assert abs(profile.distinct - 20_000) / 20_000 < 0.03
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from ranking import top_k, RankStats, REPEAT_TEMPLATE, REPEAT_BINDING, REPEAT_COLUMN
+
+
+class _Template:
+    def __init__(self, name, binding="b"):
+        self.name = name
+        self.binding = binding
+
+
+def _candidates(*specs):
+    """(score, template, binding) triples as top_k input."""
+    return [(score, (template, binding)) for score, template, binding in specs]
+
+
+def test_top_k_keeps_the_best_without_repeats():
+    a, b, c = _Template("a", "x"), _Template("b", "y"), _Template("c", "z")
+    picked = top_k(_candidates((0.5, a, {"col": 1}), (0.9, b, {"col": 2}), (0.7, c, {"col": 3})), 2)
+    assert [(score, item[0].name) for score, item in picked] == [(0.9, "b"), (0.7, "c")]
+
+
+def test_top_k_discounts_repeated_templates_bindings_and_columns():
+    hist, box = _Template("hist", "each"), _Template("box", "each")
+    picked = top_k(_candidates(
+        (1.0, hist, {"col": "a"}),
+        (0.9, hist, {"col": "b"}),
+        (0.7, box, {"col": "a"}),
+        (0.5, box, {"col": "c"}),
+    ), 4)
+    names = [(item[0].name, item[1]["col"]) for _, item in picked]
+    assert names == [("hist", "a"), ("box", "a"), ("hist", "b"), ("box", "c")]
+    scores = [score for score, _ in picked]
+    # box/a after hist/a: same binding and column
+    assert np.isclose(scores[1], 0.7 * REPEAT_BINDING * REPEAT_COLUMN)
+    # hist/b after both: same template, binding picked twice
+    assert np.isclose(scores[2], 0.9 * REPEAT_TEMPLATE * REPEAT_BINDING ** 2)
+    # box/c last: same template, binding picked three times
+    assert np.isclose(scores[3], 0.5 * REPEAT_TEMPLATE * REPEAT_BINDING ** 3)
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_top_k_breaks_ties_in_candidate_order():
+    templates = [_Template(str(i), str(i)) for i in range(5)]
+    picked = top_k(_candidates(*[(0.5, t, {"col": i}) for i, t in enumerate(templates)]), 3)
+    assert [item[0].name for _, item in picked] == ["0", "1", "2"]
+    assert top_k(_candidates((0.5, templates[0], {"col": 0})), 0) == []
+
+
+def test_rank_stats_score_shape_of_the_sample():
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=2000)
+    sample = pd.DataFrame({
+        "x": x, "y": 2 * x + rng.normal(scale=0.1, size=2000), "noise": rng.normal(size=2000),
+        "skewed": rng.lognormal(0, 1.5, 2000), "group": rng.choice(["a", "b", "c"], 2000),
+    })
+    columns = {c: {"type": "numeric", "unique_values": 2000} for c in ("x", "y", "noise", "skewed")}
+    columns["group"] = {"type": "categorical", "unique_values": 3}
+    stats = RankStats(columns, sample)
+    assert stats.corr("x", "y") > 0.9 > 0.1 > stats.corr("x", "noise")
+    assert stats.distribution("skewed") > stats.distribution("noise")
+    assert 0.0 <= stats.grouped("x", "group") < 0.05
@@ -0,0 +1,51 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from serialization import negotiate_format, dumps, render_result, ARROW_MEDIA_TYPE, COLUMNAR_MEDIA_TYPE
+
+CSV = b"when,amount,label\n2024-01-01,1.5,a\n2024-01-02,,b\n,3.5,\n"
+
+
+def test_explicit_format_wins_over_accept():
+    assert negotiate_format("columnar", ARROW_MEDIA_TYPE) == "columnar"
+    assert negotiate_format(None, f"{ARROW_MEDIA_TYPE}, application/json") == "arrow"
+    assert negotiate_format(None, COLUMNAR_MEDIA_TYPE) == "columnar"
+    assert negotiate_format("bogus", "application/json") == "records"
+    assert negotiate_format(None, None) == "records"
+
+
+def test_dumps_handles_numpy_dates_and_missing_values():
+    value = {"n": np.int64(3), "f": np.float32(0.5), "a": np.arange(2), "d": pd.Timestamp("2024-01-02"),
+             "nat": pd.NaT, 7: "non-string key"}
+    assert json.loads(dumps(value)) == {"n": 3, "f": 0.5, "a": [0, 1], "d": "2024-01-02T00:00:00",
+                                        "nat": None, "7": "non-string key"}
+
+
+def test_records_and_columnar_carry_the_same_preview():
+    preview = pd.DataFrame({"when": pd.to_datetime(["2024-01-01", None]), "amount": [1.5, np.nan],
+                            "label": ["a", None]})
+    result = {"shape": [2, 3], "preview": preview}
+    records = json.loads(render_result(result, "records").body)["preview"]
+    columnar = json.loads(render_result(result, "columnar").body)["preview"]
+    assert records == [{"when": "2024-01-01T00:00:00", "amount": 1.5, "label": "a"},
+                       {"when": None, "amount": 0.0, "label": None}]
+    assert columnar["columns"] == ["when", "amount", "label"]
+    assert [dict(zip(columnar["columns"], row)) for row in zip(*columnar["data"].values())] == records
+
+
+def test_endpoint_negotiates_arrow(client):
+    response = client.post("/analyze-data", files={"file": ("d.csv", CSV)},
+                           headers={"Accept": ARROW_MEDIA_TYPE})
+    assert response.headers["content-type"] == ARROW_MEDIA_TYPE
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column_names == ["when", "amount", "label"]
+    assert table.column("amount").null_count == 1
+    meta = json.loads(table.schema.metadata[b"chartyap"])
+    assert meta["shape"] == [3, 3] and "preview" not in meta
+
+    columnar = client.post("/analyze-data?format=columnar", files={"file": ("d.csv", CSV)},
+                           headers={"Accept": ARROW_MEDIA_TYPE}).json()
+    assert columnar["preview"]["data"]["amount"] == [1.5, 0.0, 3.5]
@@ -0,0 +1,64 @@
+import asyncio
+import threading
+
+import pytest
+
+from workers import WorkerPool, PoolSaturated, TaskTimeout
+
+CSV = b"a,b\n1,x\n2,y\n"
+
+
+def test_saturated_pool_rejects_then_admits_after_release():
+    async def scenario():
+        pool = WorkerPool(max_workers=1, max_queue=1, kind="thread", timeout=5)
+        gate = threading.Event()
+        running = [asyncio.ensure_future(pool.run(gate.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(PoolSaturated):
+            await pool.run(sum, [1, 2])
+        queued = asyncio.ensure_future(pool.run(sum, [1, 2], wait=True))
+        await asyncio.sleep(0.05)
+        assert not queued.done()
+        gate.set()
+        assert await asyncio.gather(*running) == [True, True]
+        assert await queued == 3
+        stats = pool.stats()
+        pool.shutdown()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert stats["rejected"] == 1 and stats["in_flight"] == 0
+
+
+def test_timed_out_task_keeps_its_slot_until_it_ends():
+    async def scenario():
+        pool = WorkerPool(max_workers=1, max_queue=0, kind="thread")
+        gate = threading.Event()
+        with pytest.raises(TaskTimeout):
+            await pool.run(gate.wait, timeout=0.05)
+        assert pool.stats()["in_flight"] == 1
+        gate.set()
+        await asyncio.sleep(0.05)
+        stats = pool.stats()
+        pool.shutdown()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert stats["timeouts"] == 1 and stats["in_flight"] == 0
+
+
+def test_busy_pool_answers_503(client, app_module, monkeypatch):
+    pool = WorkerPool(max_workers=1, max_queue=0, kind="thread")
+    pool._in_flight = 1  # every slot taken
+    monkeypatch.setattr(app_module, "worker_pool", pool)
+    response = client.post("/analyze-data", files={"file": ("d.csv", CSV)})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+
+def test_slow_task_answers_504(client, app_module, monkeypatch):
+    pool = WorkerPool(max_workers=1, kind="thread", timeout=1e-6)
+    monkeypatch.setattr(app_module, "worker_pool", pool)
+    response = client.post("/analyze-data", files={"file": ("d.csv", CSV)})
+    assert response.status_code == 504
+    pool.shutdown()
@@ -0,0 +1,105 @@
+import os
+import asyncio
+import functools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+
+class PoolSaturated(Exception):
+    """Raised when every worker is busy and the wait queue is full."""
+
+
+class TaskTimeout(Exception):
+    """Raised when a task does not finish within its timeout."""
+
+
+class WorkerPool:
+    """
+    Runs CPU-bound functions off the event loop with bounded admission.
+
+    At most `max_workers` tasks execute and `max_queue` more may wait;
+    anything beyond that is rejected immediately with PoolSaturated so the
+    endpoint can answer 503 instead of piling up work. `kind` is "process"
+    (default; true parallelism, arguments and results are pickled) or
+    "thread" (cheaper hand-off, parallel only where the GIL is released).
+
+    A timed-out task stops being awaited, but a task already running in a
+    worker process cannot be interrupted and still occupies its slot until
+    it returns.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue: Optional[int] = None,
+                 timeout: float = 120.0, kind: str = "process"):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = self.max_workers * 2 if max_queue is None else max_queue
+        self.timeout = timeout
+        self.kind = kind
+        self._executor = None
+        self._in_flight = 0
+        self._waiters = deque()
+        self.rejected = 0
+        self.timeouts = 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.kind == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None,
+                  wait: bool = False, **kwargs) -> Any:
+        """
+        Runs fn(*args, **kwargs) on the pool. When the pool is saturated this
+        raises PoolSaturated, or with `wait` queues for the next free slot
+        (used by batch jobs that already limit their own concurrency).
+        """
+        loop = asyncio.get_running_loop()
+        # Admission is checked and counted on the event loop thread, so no lock is needed
+        while self._in_flight >= self.max_workers + self.max_queue:
+            if not wait:
+                self.rejected += 1
+                raise PoolSaturated()
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            await waiter
+
+        self._in_flight += 1
+        future = loop.run_in_executor(self._get_executor(), functools.partial(fn, *args, **kwargs))
+        # The slot is released when the work really ends, not when we stop waiting
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise TaskTimeout()
+        except BrokenProcessPool:
+            # a worker died (e.g. OOM-killed); start a fresh pool for later requests
+            self._executor = None
+            raise
+
+    def _release(self, _future):
+        self._in_flight -= 1
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
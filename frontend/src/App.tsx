@@ -148,10 +148,10 @@ function App() {
             <h2 className="swiss-title text-2xl uppercase border-l-4 border-[var(--swiss-red)] pl-4">
               01. Upload Data
             </h2>
-            <p className="text-sm text-gray-600 mb-2">Supported: CSV, Excel. Drag & Drop.</p>
+            <p className="text-sm text-gray-600 mb-2">Supported: CSV (plain, .gz, .zst), Excel, Parquet, Feather/Arrow. Drag & Drop.</p>
             <Dropzone
               onDrop={handleDataDrop}
-              accept={{ 'text/csv': ['.csv'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': ['.xlsx'] }}
+              accept={{ 'text/csv': ['.csv'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': ['.xlsx'], 'application/octet-stream': ['.parquet', '.feather', '.arrow', '.gz', '.zst'] }}
               label={dataReady ? "Data Loaded" : "Drop Data File"}
               icon="data"
             />
@@ -10,6 +10,7 @@ interface ChartRecommendation {
     encoding: any;
     transform?: any[];
     mark?: any;
+    data?: any[];
 }
 
 interface ChartGalleryProps {
@@ -28,7 +29,8 @@ export const ChartGallery: React.FC<ChartGalleryProps> = ({ recommendations, dat
             // Remove title from internal spec in expanded mode to handle it externally
             title: isExpanded ? undefined : { text: rec.title, fontSize: 16, font: 'Inter', anchor: 'start' },
             description: rec.description,
-            data: { values: data },
+            // Server-side aggregated recommendations carry their own rows
+            data: { values: rec.data ?? data },
             mark: rec.type,
             encoding: rec.encoding,
             transform: rec.transform,